@@ -0,0 +1,87 @@
+"""
+Comparación del muestreo de Gibbs en serie y en paralelo (AD-LDA) del modelo
+LDA por lotes sobre un corpus sintético.
+
+Muestra el tiempo por iteración, la aceleración y la diferencia en la
+log-verosimilitud conjunta respecto al muestreo en serie.
+"""
+
+import time
+import numpy as np
+from scipy import sparse
+
+from LDA_Lotes import SentimentSTLDA
+from Nucleo_Gibbs import joint_log_likelihood
+from Paralelo_LDA import ParallelGibbs
+
+
+def synthetic_corpus(nD, nW, nU, nS=5, words_per_doc=40, seed=0):
+    '''
+    Genera un corpus sintético con reseñas de longitud fija.
+
+    Parameters
+    ----------
+    nD : Número de documentos.
+    nW : Tamaño del vocabulario.
+    nU : Número de usuarios.
+    nS : Número de puntuaciones distintas.
+    words_per_doc : Palabras por documento.
+    seed : Semilla.
+    '''
+    rng = np.random.RandomState(seed)
+    rows = np.repeat(np.arange(nD), words_per_doc)
+    cols = rng.zipf(1.3, size=nD * words_per_doc) % nW
+    dw = sparse.csr_matrix((np.ones(rows.size), (rows, cols)), shape=(nD, nW))
+    rate = rng.randint(1, nS + 1, size=nD)
+    user = np.concatenate([np.arange(nU), rng.randint(0, nU, size=nD - nU)])
+    return dw, rate, user
+
+
+def run(model, niter, alpha, eta, nworkers=1, nsync=1):
+    '''
+    Ejecuta niter iteraciones y devuelve el tiempo por iteración y la
+    log-verosimilitud de cada iteración.
+    '''
+    ta, ust, stw = model.init_gibbs_sampler()
+    parallel = None
+    if nworkers > 1:
+        parallel = ParallelGibbs(model, nworkers, nsync)
+        ta, ust, stw = parallel.share(ta, ust, stw)
+
+    loglik = []
+    start = time.time()
+    for _ in range(niter):
+        if parallel is None:
+            ta, ust, stw = model.gibbs_iteration(ta, ust, stw, alpha, eta)
+        else:
+            ta, ust, stw = parallel.iteration(ta, ust, stw, alpha, eta)
+        loglik.append(joint_log_likelihood(ust, stw, alpha, eta))
+    elapsed = (time.time() - start) / niter
+
+    if parallel is not None:
+        ta, ust, stw = parallel.close()
+    return elapsed, np.array(loglik)
+
+
+if __name__ == "__main__":
+    # Parámetros del corpus y del modelo (cambiar a los deseados)
+    nD, nW, nU = 20000, 5000, 2000
+    nT, niter, alpha, eta, seed = 10, 20, 0.1, 0.01, 123
+    engine = "numba"
+    workers = [2, 4, 8]
+    nsync = 1
+
+    dw, rate, user = synthetic_corpus(nD, nW, nU)
+    model = SentimentSTLDA(nT, rate, user, dw, seed, engine=engine)
+
+    # Compilar el núcleo antes de medir tiempos
+    model.gibbs_iteration(*model.init_gibbs_sampler(), alpha, eta)
+
+    serial_time, serial_ll = run(model, niter, alpha, eta)
+    print(f"Serie: {serial_time:.3f} s/iter, log-verosimilitud final {serial_ll[-1]:.1f}")
+
+    for nworkers in workers:
+        par_time, par_ll = run(model, niter, alpha, eta, nworkers, nsync)
+        drift = (par_ll[-1] - serial_ll[-1]) / abs(serial_ll[-1])
+        print(f"{nworkers} procesos: {par_time:.3f} s/iter, aceleración {serial_time / par_time:.1f}x, "
+              f"log-verosimilitud final {par_ll[-1]:.1f} (diferencia relativa {drift:+.2e})")
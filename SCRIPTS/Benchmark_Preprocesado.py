@@ -0,0 +1,132 @@
+"""
+Comprobación y comparación de tiempos de la limpieza de texto de
+Preprocesado.py.
+
+Compara preprocess_text y preprocess_series con las salidas guardadas de la
+cadena original de sustituciones para un conjunto fijo de reseñas de
+referencia, y con la propia cadena original sobre reseñas aleatorias, y
+muestra el tiempo de cada versión. Termina con error si alguna salida no
+coincide.
+"""
+
+import re
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+from Preprocesado import preprocess_text, preprocess_series
+
+# Reseñas de referencia con los casos delicados de la limpieza y su salida con
+# la versión original de Preprocesado.py
+GOLDEN = [
+    ("This book was AMAZING!!!!! 10/10 would read again :)",
+     "this book was amazing       would read again "),
+    ("Check https://www.goodreads.com/book/show/1 and www.example.com/page for more",
+     "check and for more"),
+    ("Contact me at reader.42@mail.com, or don't.",
+     "contact me at reader    mail com or don t "),
+    ("Sooooooo good... I loved it\n\nReally\tloved it\r\n",
+     "s good i loved it really loved it "),
+    ("Café, naïve résumé — “quotes” and ‘single’ ones… 日本語のレビュー",
+     "caf na ve r sum quotes and single ones "),
+    ("snake_case_words and numbers 2nd 3rd 1984",
+     "snake case words and numbers  nd  rd     "),
+    ("wwwwwww.not-a-url.com hhhhhttp://weird.link end",
+     "wwww hhhh end"),
+    ("a  1 b__c   9",
+     "a   b  c  "),
+    ("     leading and trailing     ",
+     " leading and trailing "),
+    ("", ""),
+]
+
+
+def preprocess_text_reference(text):
+    '''
+    Cadena original de sustituciones de Preprocesado.py, usada como referencia.
+
+    Parameters
+    ----------
+    text : str
+        Reseña de texto que será procesada.
+    '''
+    text = re.sub(r'https?://\S+|www\.\S+', '', text)
+    text = re.sub(r'[\n\r\t]', ' ', text)
+    text = re.sub(r'(.)\1{4,}', ' ', text)
+    text = re.sub(r'[^\w\s]', ' ', text)
+    text = re.sub(r'[^\x00-\x7F]+', ' ', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\S*@\S*\s?', '', text)
+    text = re.sub(r'\'', '', text)
+    text = re.sub(r'[^a-zA-Z]', ' ', text)
+    text = text.lower()
+    return text
+
+
+def synthetic_reviews(n, length=600, seed=0):
+    '''
+    Genera reseñas aleatorias con letras, dígitos, puntuación, espacios,
+    caracteres no ASCII, URLs, correos y repeticiones.
+
+    Parameters
+    ----------
+    n : Número de reseñas.
+    length : Número de fragmentos por reseña.
+    seed : Semilla.
+    '''
+    pieces = (list("abcdefghijKLMNOPQRST0123456789_ .,;:!?'\"()-@#\n\r\t") +
+              ["é", "ñ", "—", "…", "日本", "\xa0", " ", "\x0b", "\x1c"] +
+              ["the ", "book ", "loved ", "https://t.co/x ", "www.a.com ", "me@x.org ",
+               "aaaaaa", "!!!!!", "     ", "wwwww", "don't "])
+    rng = np.random.RandomState(seed)
+    return ["".join(rng.choice(pieces, size=rng.randint(0, length))) for _ in range(n)]
+
+
+if __name__ == "__main__":
+    # Parámetros de la comparación (cambiar a los deseados)
+    nreviews = 20000
+
+    # Reseñas de referencia: salidas guardadas
+    golden_reviews = [review for review, _ in GOLDEN]
+    golden_series = preprocess_series(pd.Series(golden_reviews)).tolist()
+    for (review, expected), cleaned in zip(GOLDEN, golden_series):
+        if preprocess_text(review) != expected or cleaned != expected:
+            print(f"La reseña de referencia {review!r} no coincide con la salida guardada")
+            print(f"  esperada:           {expected!r}")
+            print(f"  preprocess_text:    {preprocess_text(review)!r}")
+            print(f"  preprocess_series:  {cleaned!r}")
+            sys.exit(1)
+    print(f"{len(GOLDEN)} reseñas de referencia, todas coinciden con la salida guardada")
+
+    reviews = golden_reviews + synthetic_reviews(nreviews)
+    series = pd.Series(reviews)
+
+    start = time.time()
+    expected = [preprocess_text_reference(text) for text in reviews]
+    reference_time = time.time() - start
+
+    start = time.time()
+    cleaned = [preprocess_text(text) for text in reviews]
+    text_time = time.time() - start
+
+    start = time.time()
+    cleaned_series = preprocess_series(series).tolist()
+    series_time = time.time() - start
+
+    mismatches = [i for i in range(len(reviews))
+                  if cleaned[i] != expected[i] or cleaned_series[i] != expected[i]]
+    if mismatches:
+        i = mismatches[0]
+        print(f"{len(mismatches)} reseñas no coinciden, primera: {reviews[i]!r}")
+        print(f"  referencia:         {expected[i]!r}")
+        print(f"  preprocess_text:    {cleaned[i]!r}")
+        print(f"  preprocess_series:  {cleaned_series[i]!r}")
+        sys.exit(1)
+
+    print(f"{len(reviews)} reseñas, todas coinciden con la referencia")
+    print(f"Referencia:        {reference_time:.2f} s ({len(reviews) / reference_time:.0f} reseñas/s)")
+    print(f"preprocess_text:   {text_time:.2f} s ({len(reviews) / text_time:.0f} reseñas/s), "
+          f"aceleración {reference_time / text_time:.1f}x")
+    print(f"preprocess_series: {series_time:.2f} s ({len(reviews) / series_time:.0f} reseñas/s), "
+          f"aceleración {reference_time / series_time:.1f}x")
@@ -1,56 +1,154 @@
 """
 Script para analizar la evolución de la proporción de documentos asignados
 a cada tópico a lo largo de las iteraciones del modelo LDA, separando por sentimiento.
+
+La moda acumulada de la asignación de cada documento se calcula por bloques de
+documentos con un conteo acumulado (one-hot) a lo largo de las iteraciones, y
+las proporciones por sentimiento con un único bincount agrupado. Los
+resultados se leen con ResultsReader por bloques de documentos, sin cargar ta
+ni stw enteros en memoria.
 """
 
-import json
 import numpy as np
 import matplotlib.pyplot as plt
-import pandas as pd
 import matplotlib.gridspec as gridspec
+from Resultados_LDA import ResultsReader
+from Corpus_LDA import load_corpus_vector
+
+
+def sentiment_codes(rate):
+    '''
+    Codifica las puntuaciones como sentimientos 0..nS-1 en orden creciente.
+
+    Parameters
+    ----------
+    rate : Puntuación de cada documento.
+    '''
+    _, codes = np.unique(rate, return_inverse=True)
+    return codes.reshape(-1)
 
-# Cargar resultados desde JSON
-with open(" .json", "r") as f:
-    results = json.load(f)
 
-# Convertir datos en arrays de NumPy
-results_stw = np.array(results['stw'])  
-results_ta = np.array(results['ta'])   
-nS, nT, nW, nIter = results_stw.shape  
+def _chunk_size(nIter, nT, max_elements):
+    '''Número de documentos por bloque para no superar max_elements conteos.'''
+    return max(1, max_elements // max(1, nIter * nT))
 
-# Cargar sentimientos
-rate = pd.read_csv(" .csv")['x'].values
-unique_sentiments = np.unique(rate)
-sentiment_mapping = {val: idx for idx, val in enumerate(unique_sentiments)}
-results_true = np.array([sentiment_mapping[val] for val in rate])  
 
-# Calcular la moda
-def calcular_moda_ta(results_ta):
+def calcular_moda_ta(results_ta, nT=None, max_elements=2**26):
+    '''
+    Moda acumulada del tópico asignado a cada documento: para cada iteración
+    i, el tópico más repetido en las iteraciones 0..i (a igualdad, el de menor
+    índice, como np.argmax). Devuelve un array nD x nIter.
+
+    Parameters
+    ----------
+    results_ta : Tópico asignado a cada documento en cada iteración (nD x nIter).
+    nT : Número de tópicos (por defecto, el mayor tópico asignado más uno).
+    max_elements : Número máximo de conteos por bloque de documentos (memoria).
+    '''
+    results_ta = np.asarray(results_ta)
     nD, nIter = results_ta.shape
+    if nT is None:
+        nT = int(results_ta.max()) + 1 if results_ta.size else 1
     moda_ta = np.zeros((nD, nIter), dtype=int)
-    for d in range(nD):
-        conteo = np.zeros(nT, dtype=int)  
-        for i in range(nIter):
-            aux = int(results_ta[d, i])  
-            conteo[aux] += 1   
-            moda_ta[d, i] = np.argmax(conteo)  
+    if nIter == 0:
+        return moda_ta
+
+    topics = np.arange(nT)
+    dtype = np.min_scalar_type(nIter)
+    chunk = _chunk_size(nIter, nT, max_elements)
+    for start in range(0, nD, chunk):
+        block = results_ta[start:start + chunk].astype(np.int64)
+        # Conteo acumulado de cada tópico a lo largo de las iteraciones
+        conteo = (block[:, :, None] == topics).astype(dtype)
+        np.cumsum(conteo, axis=1, out=conteo)
+        moda_ta[start:start + chunk] = np.argmax(conteo, axis=2)
     return moda_ta
 
-#Calcular la proporción
-def calcular_proporcion_por_sentimiento(moda_ta):
-    proporcion_st = np.zeros((nS, nT, nIter))
-    for s in range(nS):
-        docs_sentimiento = np.where(results_true == s)[0]  
-        for i in range(nIter):
-            topicos_asignados = moda_ta[docs_sentimiento, i]
-            counts = np.bincount(topicos_asignados, minlength=nT)  
-            proporcion_st[s, :, i] = counts / len(docs_sentimiento)  
-    return proporcion_st
+
+def contar_por_sentimiento(moda_ta, results_true, nS, nT, max_elements=2**26):
+    '''
+    Número de documentos de cada sentimiento asignados a cada tópico en cada
+    iteración (según la moda acumulada), con un bincount agrupado por
+    (sentimiento, iteración, tópico). Devuelve un array nS x nT x nIter.
+
+    Parameters
+    ----------
+    moda_ta : Moda acumulada de cada documento (ver calcular_moda_ta).
+    results_true : Sentimiento (0..nS-1) de cada documento.
+    nS : Número de sentimientos.
+    nT : Número de tópicos.
+    max_elements : Número máximo de asignaciones por bloque de documentos (memoria).
+    '''
+    moda_ta = np.asarray(moda_ta)
+    results_true = np.asarray(results_true, dtype=np.int64)
+    nD, nIter = moda_ta.shape
+
+    counts = np.zeros(nS * nIter * nT, dtype=np.int64)
+    offset = np.arange(nIter) * nT
+    chunk = max(1, max_elements // max(1, nIter))
+    for start in range(0, nD, chunk):
+        block = moda_ta[start:start + chunk]
+        key = (results_true[start:start + chunk, None] * (nIter * nT) + offset) + block
+        counts += np.bincount(key.ravel(), minlength=counts.size)
+    return counts.reshape(nS, nIter, nT).transpose(0, 2, 1)
+
+
+def _dividir_por_documentos(counts, results_true, nS):
+    '''Divide los conteos de cada sentimiento por su número de documentos.'''
+    docs_sentimiento = np.bincount(np.asarray(results_true, dtype=np.int64), minlength=nS)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return counts / docs_sentimiento[:, None, None]
+
+
+def calcular_proporcion_por_sentimiento(moda_ta, results_true, nS=None, nT=None, max_elements=2**26):
+    '''
+    Proporción de documentos de cada sentimiento asignados a cada tópico en
+    cada iteración (según la moda acumulada). Devuelve un array nS x nT x nIter.
+
+    Parameters
+    ----------
+    moda_ta : Moda acumulada de cada documento (ver calcular_moda_ta).
+    results_true : Sentimiento (0..nS-1) de cada documento.
+    nS : Número de sentimientos (por defecto, el mayor más uno).
+    nT : Número de tópicos (por defecto, el mayor tópico de la moda más uno).
+    max_elements : Número máximo de asignaciones por bloque de documentos (memoria).
+    '''
+    moda_ta = np.asarray(moda_ta)
+    results_true = np.asarray(results_true, dtype=np.int64)
+    if nS is None:
+        nS = int(results_true.max()) + 1 if results_true.size else 1
+    if nT is None:
+        nT = int(moda_ta.max()) + 1 if moda_ta.size else 1
+    counts = contar_por_sentimiento(moda_ta, results_true, nS, nT, max_elements)
+    return _dividir_por_documentos(counts, results_true, nS)
+
+
+def proporcion_desde_resultados(reader, results_true, nS, nT):
+    '''
+    Proporción por sentimiento (como calcular_proporcion_por_sentimiento)
+    leyendo ta por bloques de documentos: la moda acumulada de cada bloque se
+    cuenta y se descarta, de modo que nunca se tiene en memoria más de un bloque.
+
+    Parameters
+    ----------
+    reader : ResultsReader abierto sobre el archivo de resultados.
+    results_true : Sentimiento (0..nS-1) de cada documento.
+    nS : Número de sentimientos.
+    nT : Número de tópicos.
+    '''
+    results_true = np.asarray(results_true, dtype=np.int64)
+    counts = np.zeros((nS, nT, reader.shape('ta')[-1]), dtype=np.int64)
+    for index, block in reader.iter_blocks('ta'):
+        moda_ta = calcular_moda_ta(block, nT)
+        counts += contar_por_sentimiento(moda_ta, results_true[index], nS, nT)
+    return _dividir_por_documentos(counts, results_true, nS)
+
 
 def graficar_proporcion_por_sentimiento(proporcion_st):
     '''
     Distribuye los subplots como: 2 arriba, 2 en medio y 1 abajo.
     '''
+    nS, nT, _ = proporcion_st.shape
     fig = plt.figure(figsize=(16, 12))
     gs = gridspec.GridSpec(3, 2, height_ratios=[1, 1, 1])
 
@@ -70,7 +168,14 @@ def graficar_proporcion_por_sentimiento(proporcion_st):
     # plt.savefig("grafico_2_1_2_sentimientos.png", dpi=300)
     plt.show()
 
-# Ejecutar cálculos
-moda_ta = calcular_moda_ta(results_ta)
-proporcion_st = calcular_proporcion_por_sentimiento(moda_ta)
-graficar_proporcion_por_sentimiento(proporcion_st)
+
+if __name__ == "__main__":
+    # Cargar sentimientos
+    rate = load_corpus_vector("corpus", "rate")
+    results_true = sentiment_codes(rate)
+
+    # Leer resultados por bloques (NPZ, HDF5 o JSON heredado) y ejecutar cálculos
+    with ResultsReader(" .npz") as reader:
+        nS, nT = reader.shape('stw')[:2]
+        proporcion_st = proporcion_desde_resultados(reader, results_true, nS, nT)
+    graficar_proporcion_por_sentimiento(proporcion_st)
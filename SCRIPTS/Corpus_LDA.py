@@ -0,0 +1,152 @@
+"""
+Representación dispersa de la matriz documento-palabra para los modelos LDA.
+
+Los modelos aceptan la matriz en formato denso (nD x nW), como matriz dispersa
+de scipy (CSR, CSC, COO...) o como lista con los índices de las palabras de
+cada documento. Internamente se trabaja siempre con una matriz CSR, de forma
+que cada documento solo recorre las columnas en las que aparece.
+
+El corpus completo (matriz CSR, puntuaciones, usuarios codificados y
+vocabulario) se guarda en una carpeta de archivos binarios con save_corpus,
+que los modelos cargan directamente con load_corpus. Por defecto los arrays se
+abren mapeados en memoria (np.load con mmap_mode='r'): la carga es casi
+inmediata y varios procesos en la misma máquina comparten la misma copia en
+la caché de páginas del sistema.
+
+- `indptr.npy`, `indices.npy`, `data.npy`: matriz documento-palabra CSR.
+- `rate.npy`: puntuación de cada documento.
+- `user.npy`: usuario de cada documento, como enteros consecutivos desde 0.
+- `vocabulary.json`: palabra de cada columna.
+- `users.json`: user_id original de cada código de usuario.
+"""
+
+import os
+import json
+import numpy as np
+from scipy import sparse
+
+# Archivos de la matriz CSR dentro de la carpeta del corpus
+CSR_FILES = ("indptr", "indices", "data")
+
+
+def to_csr(matrix_words, nW=None):
+    '''
+    Convierte la matriz documento-palabra a una matriz CSR con índices ordenados.
+
+    Parameters
+    ----------
+    matrix_words : Matriz densa (nD x nW), matriz dispersa de scipy o lista
+        con los índices de las palabras (tokens) de cada documento.
+    nW : Tamaño del vocabulario. Solo se usa con la representación por índices;
+        si no se indica, se toma el mayor índice más uno.
+    '''
+    if hasattr(matrix_words, "to_numpy"):
+        matrix_words = matrix_words.to_numpy()
+
+    if sparse.issparse(matrix_words) or (isinstance(matrix_words, np.ndarray) and matrix_words.ndim == 2):
+        dw = sparse.csr_matrix(matrix_words, dtype=np.float64)
+    else:
+        # Representación por índices: una lista de tokens por documento
+        docs = [np.asarray(doc, dtype=np.int64).ravel() for doc in matrix_words]
+        lengths = np.array([len(doc) for doc in docs], dtype=np.int64)
+        cols = np.concatenate(docs) if docs else np.zeros(0, dtype=np.int64)
+        rows = np.repeat(np.arange(len(docs)), lengths)
+        if nW is None:
+            nW = int(cols.max()) + 1 if cols.size else 0
+        # Los tokens repetidos se suman al construir la matriz
+        dw = sparse.csr_matrix((np.ones(cols.size), (rows, cols)), shape=(len(docs), nW))
+
+    # La matriz solo se modifica (y, si es de solo lectura, se copia) cuando
+    # no está ya en forma canónica, de modo que un corpus mapeado en memoria
+    # se usa sin copiarlo
+    if not dw.has_canonical_format or np.any(dw.data == 0):
+        if not dw.data.flags.writeable or not dw.indices.flags.writeable:
+            dw = dw.copy()
+        dw.sum_duplicates()
+        dw.eliminate_zeros()
+        dw.sort_indices()
+    return dw
+
+
+def doc_words(dw, d):
+    '''
+    Devuelve las columnas no nulas del documento d y sus conteos.
+
+    Parameters
+    ----------
+    dw : Matriz documento-palabra en formato CSR.
+    d : Índice del documento.
+    '''
+    start, end = dw.indptr[d], dw.indptr[d + 1]
+    return dw.indices[start:end], dw.data[start:end]
+
+
+def save_corpus(directory, dw, rate, user, vocabulary, user_ids=None):
+    '''
+    Guarda el corpus en una carpeta de archivos binarios.
+
+    Parameters
+    ----------
+    directory : Carpeta de salida.
+    dw : Matriz documento-palabra (se convierte a CSR).
+    rate : Puntuación de cada documento.
+    user : Usuario de cada documento (enteros consecutivos desde 0).
+    vocabulary : Palabra de cada columna.
+    user_ids : user_id original de cada código de usuario (opcional).
+    '''
+    dw = to_csr(dw)
+    os.makedirs(directory, exist_ok=True)
+    for name in CSR_FILES:
+        np.save(os.path.join(directory, name + ".npy"), getattr(dw, name))
+    np.save(os.path.join(directory, "rate.npy"), np.asarray(rate))
+    np.save(os.path.join(directory, "user.npy"), np.asarray(user, dtype=np.int64))
+    with open(os.path.join(directory, "vocabulary.json"), "w", encoding="utf-8") as f:
+        json.dump(list(vocabulary), f)
+    if user_ids is not None:
+        with open(os.path.join(directory, "users.json"), "w", encoding="utf-8") as f:
+            json.dump(list(user_ids), f)
+
+
+def load_vocabulary(directory):
+    '''
+    Devuelve el vocabulario de un corpus guardado con save_corpus.
+
+    Parameters
+    ----------
+    directory : Carpeta del corpus.
+    '''
+    with open(os.path.join(directory, "vocabulary.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_corpus_vector(directory, name, mmap=True):
+    '''
+    Devuelve un vector del corpus ("rate" o "user") sin cargar la matriz.
+
+    Parameters
+    ----------
+    directory : Carpeta del corpus.
+    name : "rate" o "user".
+    mmap : Si es True, el array se abre mapeado en memoria (solo lectura).
+    '''
+    return np.load(os.path.join(directory, name + ".npy"), mmap_mode="r" if mmap else None)
+
+
+def load_corpus(directory, mmap=True):
+    '''
+    Carga un corpus guardado con save_corpus y devuelve la matriz CSR, las
+    puntuaciones, los usuarios y el vocabulario.
+
+    Parameters
+    ----------
+    directory : Carpeta del corpus.
+    mmap : Si es True, los arrays se abren mapeados en memoria (solo lectura)
+        en lugar de leerse completos.
+    '''
+    mmap_mode = "r" if mmap else None
+    arrays = {name: np.load(os.path.join(directory, name + ".npy"), mmap_mode=mmap_mode) for name in CSR_FILES}
+    vocabulary = load_vocabulary(directory)
+    shape = (len(arrays["indptr"]) - 1, len(vocabulary))
+    dw = sparse.csr_matrix((arrays["data"], arrays["indices"], arrays["indptr"]), shape=shape, copy=False)
+    return (dw, load_corpus_vector(directory, "rate", mmap), load_corpus_vector(directory, "user", mmap),
+            vocabulary)
@@ -0,0 +1,158 @@
+"""
+Diagnósticos de convergencia calculados durante el muestreo de Gibbs.
+
+Cada nupdate iteraciones los modelos registran la log-verosimilitud conjunta
+(Nucleo_Gibbs.joint_log_likelihood), la fracción de documentos que han
+cambiado de tópico desde el registro anterior y la proporción de documentos
+de cada sentimiento asignados a cada tópico. Cada registro se añade como una
+fila a un CSV, que se puede consultar mientras el modelo sigue ejecutándose.
+
+Opcionalmente, el calentamiento (burn-in) termina antes de lo previsto cuando
+las métricas se estabilizan: durante stop_patience registros seguidos, el
+cambio relativo de la log-verosimilitud es menor que stop_tol y el de las
+proporciones y la fracción de cambios menor que stop_prop_tol.
+"""
+
+import csv
+import os
+import numpy as np
+
+from Nucleo_Gibbs import joint_log_likelihood
+
+
+class ConvergenceMonitor:
+    def __init__(self, sa_true, nS, nT, path=None, append=False, stop_tol=1e-3, stop_prop_tol=0.01,
+                 stop_patience=3):
+        '''
+        Calcula y registra los diagnósticos de convergencia del muestreo.
+
+        Parameters
+        ----------
+        sa_true : Sentimiento (0..nS-1) de cada documento.
+        nS : Número de sentimientos.
+        nT : Número de tópicos.
+        path : Archivo CSV de los registros (None para no guardarlos).
+        append : Añadir los registros a un archivo existente (al reanudar).
+        stop_tol : Cambio relativo máximo de la log-verosimilitud para
+            considerar que se ha estabilizado.
+        stop_prop_tol : Cambio absoluto máximo de las proporciones y de la
+            fracción de documentos que cambian de tópico.
+        stop_patience : Número de registros seguidos que deben cumplir los
+            criterios para dar por terminado el calentamiento.
+        '''
+        self.sa_true = np.asarray(sa_true, dtype=np.int64)
+        self.nS = nS
+        self.nT = nT
+        self.docs_sentiment = np.bincount(self.sa_true, minlength=nS)
+        self.stop_tol = stop_tol
+        self.stop_prop_tol = stop_prop_tol
+        self.stop_patience = stop_patience
+        self.previous_ta = None
+        self.last = None
+        self.stable_checks = 0
+        self.history = []
+
+        self.file = None
+        if path is not None:
+            exists = append and os.path.exists(path) and os.path.getsize(path) > 0
+            self.file = open(path, 'a' if exists else 'w', newline='')
+            self.writer = csv.writer(self.file)
+            if not exists:
+                self.writer.writerow(["iteration", "loglik", "changed"] +
+                                     [f"prop_s{s}_t{t}" for s in range(nS) for t in range(nT)])
+                self.file.flush()
+
+    def proportions(self, ta):
+        '''
+        Proporción de documentos de cada sentimiento asignados a cada tópico (nS x nT).
+
+        Parameters
+        ----------
+        ta : Asignación actual de tópicos.
+        '''
+        counts = np.bincount(self.sa_true * self.nT + np.asarray(ta, dtype=np.int64),
+                             minlength=self.nS * self.nT).reshape(self.nS, self.nT)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return counts / self.docs_sentiment[:, None]
+
+    def update(self, iteration, ta, ust, stw, alpha, eta):
+        '''
+        Calcula los diagnósticos del estado actual, los registra y actualiza el
+        criterio de parada. Devuelve el registro.
+
+        Parameters
+        ----------
+        iteration : Iteración actual.
+        ta : Asignación actual de tópicos.
+        ust : Matriz de conteo usuario-sentimiento-tópico.
+        stw : Matriz de conteo sentimiento-tópico-palabra.
+        alpha : Hiperparámetro para la distribución Dirichlet.
+        eta : Hiperparámetro para la distribución Dirichlet.
+        '''
+        ta = np.asarray(ta)
+        record = {
+            "iteration": int(iteration),
+            "loglik": joint_log_likelihood(ust, stw, alpha, eta),
+            # Fracción de documentos con distinto tópico que en el registro anterior
+            "changed": float(np.mean(ta != self.previous_ta)) if self.previous_ta is not None else np.nan,
+            "proportions": self.proportions(ta),
+        }
+        self.previous_ta = ta.copy()
+
+        if self.last is not None and self._is_stable(self.last, record):
+            self.stable_checks += 1
+        else:
+            self.stable_checks = 0
+        self.last = record
+        self.history.append(record)
+
+        if self.file is not None:
+            self.writer.writerow([record["iteration"], record["loglik"], record["changed"]] +
+                                 record["proportions"].ravel().tolist())
+            self.file.flush()
+        return record
+
+    def _is_stable(self, previous, current):
+        '''Comprueba si las métricas apenas han cambiado desde el registro anterior.'''
+        if np.isnan(previous["changed"]) or np.isnan(current["changed"]):
+            return False
+        loglik_change = abs(current["loglik"] - previous["loglik"]) / max(abs(previous["loglik"]), 1e-12)
+        prop_change = np.nanmax(np.abs(current["proportions"] - previous["proportions"]), initial=0)
+        changed_change = abs(current["changed"] - previous["changed"])
+        return (loglik_change < self.stop_tol and prop_change < self.stop_prop_tol
+                and changed_change < self.stop_prop_tol)
+
+    def converged(self):
+        '''Indica si se cumple el criterio de parada del calentamiento.'''
+        return self.stable_checks >= self.stop_patience
+
+    def summary(self, record=None):
+        '''
+        Resumen en una línea de un registro (por defecto, el último).
+
+        Parameters
+        ----------
+        record : Registro devuelto por update.
+        '''
+        record = record or self.last
+        changed = "-" if np.isnan(record["changed"]) else f"{100 * record['changed']:.2f}%"
+        return f"log-verosimilitud {record['loglik']:.6g}, documentos que cambian de tópico {changed}"
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+def burn_in_end(iteration, nthin):
+    '''
+    Iteración en la que termina el calentamiento al detenerlo en iteration:
+    el primer múltiplo de nthin a partir de ella, para que las muestras se
+    sigan guardando con los mismos índices.
+
+    Parameters
+    ----------
+    iteration : Iteración en la que se cumple el criterio de parada.
+    nthin : Intervalo de muestreo.
+    '''
+    return -(-iteration // nthin) * nthin
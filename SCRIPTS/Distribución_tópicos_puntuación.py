@@ -3,30 +3,24 @@ Script para analizar y visualizar la distribución de asignaciones de tópicos
 por sentimiento a partir de resultados de un modelo LDA de sentimiento y tópico.
 """
 
-import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
-import json
 import numpy as np
-from scipy.stats import mode
 import matplotlib.gridspec as gridspec
+from Resultados_LDA import ResultsReader, check_vocabulary
+from Corpus_LDA import load_vocabulary, load_corpus_vector
 
 sns.set(style="whitegrid")
 
-# Cargar resultados
-with open(" .json", "r") as f:
-    results = json.load(f)
-
-results_ust = np.array(results["ust"])
-results_stw = np.array(results["stw"])
-results_ta = np.array(results["ta"])
+# Abrir resultados (NPZ, HDF5 o JSON heredado); los arrays se leen por bloques
+reader = ResultsReader(" .npz")
 
 # Cargar palabras y sentimientos
-matrix_words_df = pd.read_csv(" .csv")
-lista_palabras = matrix_words_df.columns.tolist()
-nS, nT, nW, _ = results_stw.shape 
+lista_palabras = load_vocabulary("corpus")
+check_vocabulary(reader.metadata, lista_palabras)
+nS, nT, nW, _ = reader.shape("stw")
 
-rate = pd.read_csv(" .csv")['x'].values
+rate = load_corpus_vector("corpus", "rate")
 
 # Función para analizar y graficar
 def analizar_ta_en_grid(mode_ta, sa_true):
@@ -59,8 +53,9 @@ def analizar_ta_en_grid(mode_ta, sa_true):
     plt.show()
 
 # Ejecutar análisis
-def ejecutar_analisis(results_ta, rate):
-    mode_ta = mode(results_ta, axis=-1).mode
+def ejecutar_analisis(reader, rate):
+    mode_ta = reader.mode("ta", nT)
     analizar_ta_en_grid(mode_ta, rate)
 
-ejecutar_analisis(results_ta, rate)
+ejecutar_analisis(reader, rate)
+reader.close()
@@ -2,37 +2,34 @@
 Este script calcula y analiza la divergencia KL (Kullback-Leibler) entre las 
 distribuciones de palabras para cada combinación de sentimiento y tópico 
 obtenida de un modelo LDA entrenado con reseñas de libros.
+
+La matriz de divergencias entre todas las combinaciones se calcula de una vez
+con productos de matrices, por bloques de filas: KL(P||Q) = sum p log p - P·(log Q)^T.
+También se pueden usar como métricas alternativas la divergencia de
+Jensen-Shannon y la distancia de Hellinger.
+
+La media de stw sobre las iteraciones se calcula con ResultsReader por
+bloques, sin cargar todas las muestras en memoria.
 """
 
-import json
-import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
-from scipy.special import rel_entr
+from scipy.special import rel_entr, xlogy
 from itertools import product
+from Resultados_LDA import ResultsReader, check_vocabulary
+from Corpus_LDA import load_vocabulary
 
-# Cargar los resultados
-with open(" .json", "r") as f:
-    results = json.load(f)
-
-# Extraer la matriz stw
-results_stw = np.array(results['stw'])  # Convertir a array de NumPy 
-nS, nT, nW, _ = results_stw.shape  
-
-# Extraer las palabras
-matrix_words_df = pd.read_csv(" .csv")
-words = matrix_words_df.columns.tolist()
+METRICS = {"kl": "KL", "js": "Jensen-Shannon", "hellinger": "Hellinger"}
 
 
-# Corregir ceros en las distribuciones para que no de error
-epsilon = 1e-10
-results_stw[results_stw == 0] = epsilon  
-
 # Normalizar distribuciones
 def normalize_distributions(distributions):
     return distributions / np.sum(distributions, axis=2, keepdims=True)
 
-results_stw = normalize_distributions(results_stw)
+# Corregir ceros y normalizar cada muestra de un bloque de stw sobre las palabras
+def prepare_samples(block, epsilon=1e-10):
+    block = np.where(block == 0, epsilon, block)
+    return block / np.sum(block, axis=-2, keepdims=True)
 
 # Verificar si las distribuciones están normalizadas
 def check_normalization(distributions):
@@ -45,46 +42,165 @@ def check_normalization(distributions):
         print("Ejemplo de sumas por sentimiento y tópico:\n", sums[:3, :3]) 
         print("Máxima desviación detectada:", np.max(np.abs(sums - 1))) 
 
-print("Verificando normalización de las distribuciones...")
-check_normalization(results_stw)
-
 # Función para calcular la divergencia KL
 def kl_divergence(p, q):
     return np.sum(rel_entr(p, q))
 
-# Calcular divergencia KL entre todas las combinaciones de (sentimiento, tópico)
-def compute_kl_for_all_combinations(distributions):
+
+def _block_rows(n, nW, block_size, depth=1):
+    '''Filas por bloque para que los temporales no superen unos 2**24 elementos.'''
+    if block_size is not None:
+        return max(1, block_size)
+    return max(1, 2**24 // max(1, depth * nW))
+
+
+def kl_matrix_fast(P, Q, block_size=None):
+    '''
+    Divergencia KL(P_i||Q_j) entre todas las filas de P y de Q, con el mismo
+    resultado que sumar rel_entr par a par (0 si p = 0, inf si p > 0 y q = 0).
+
+    Parameters
+    ----------
+    P : Distribuciones por filas (n x nW).
+    Q : Distribuciones por filas (m x nW).
+    block_size : Número de filas de P por bloque (por defecto, según nW).
+    '''
+    log_q = np.log(Q, out=np.zeros(Q.shape), where=Q > 0)
+    zeros_q = (Q == 0).astype(np.float64) if np.any(Q == 0) else None
+    kl = np.empty((P.shape[0], Q.shape[0]))
+    rows = _block_rows(P.shape[0], P.shape[1], block_size)
+    for start in range(0, P.shape[0], rows):
+        block = P[start:start + rows]
+        entropy = xlogy(block, block).sum(axis=1)
+        kl[start:start + rows] = entropy[:, None] - block @ log_q.T
+        if zeros_q is not None:
+            # Palabras con p > 0 y q = 0: divergencia infinita
+            kl[start:start + rows][(block > 0).astype(np.float64) @ zeros_q.T > 0] = np.inf
+    # Errores de redondeo en distribuciones casi iguales
+    return np.maximum(kl, 0)
+
+
+def js_matrix_fast(P, Q, block_size=None):
+    '''
+    Divergencia de Jensen-Shannon (en nats) entre todas las filas de P y de Q:
+    JS = (H(M) - (H(P) + H(Q)) / 2) con M = (P + Q) / 2, donde H(X) = -sum x log x.
+
+    Parameters
+    ----------
+    P : Distribuciones por filas (n x nW).
+    Q : Distribuciones por filas (m x nW).
+    block_size : Número de filas de P por bloque (por defecto, según nW y m).
+    '''
+    neg_entropy_q = xlogy(Q, Q).sum(axis=1)
+    js = np.empty((P.shape[0], Q.shape[0]))
+    rows = _block_rows(P.shape[0], P.shape[1], block_size, depth=Q.shape[0])
+    for start in range(0, P.shape[0], rows):
+        block = P[start:start + rows]
+        m = (block[:, None, :] + Q[None, :, :]) / 2
+        neg_entropy_m = xlogy(m, m).sum(axis=2)
+        js[start:start + rows] = (xlogy(block, block).sum(axis=1)[:, None] + neg_entropy_q) / 2 - neg_entropy_m
+    return np.maximum(js, 0)
+
+
+def hellinger_matrix_fast(P, Q, block_size=None):
+    '''
+    Distancia de Hellinger entre todas las filas de P y de Q:
+    H = sqrt((sum p + sum q) / 2 - sqrt(P)·sqrt(Q)^T).
+
+    Parameters
+    ----------
+    P : Distribuciones por filas (n x nW).
+    Q : Distribuciones por filas (m x nW).
+    block_size : Número de filas de P por bloque (por defecto, según nW).
+    '''
+    sqrt_q = np.sqrt(Q)
+    sum_q = Q.sum(axis=1)
+    h = np.empty((P.shape[0], Q.shape[0]))
+    rows = _block_rows(P.shape[0], P.shape[1], block_size)
+    for start in range(0, P.shape[0], rows):
+        block = P[start:start + rows]
+        h[start:start + rows] = (block.sum(axis=1)[:, None] + sum_q) / 2 - np.sqrt(block) @ sqrt_q.T
+    return np.sqrt(np.maximum(h, 0))
+
+
+_METRIC_FUNCTIONS = {"kl": kl_matrix_fast, "js": js_matrix_fast, "hellinger": hellinger_matrix_fast}
+
+
+def divergence_matrix(distributions, metric="kl", block_size=None):
+    '''
+    Matriz de divergencias entre todas las combinaciones (sentimiento, tópico),
+    con la diagonal a cero. Devuelve la matriz y la lista de combinaciones en
+    el orden de sus filas.
+
+    Parameters
+    ----------
+    distributions : Distribuciones de palabras (nS x nT x nW).
+    metric : "kl", "js" o "hellinger".
+    block_size : Número de filas por bloque.
+    '''
+    if metric not in _METRIC_FUNCTIONS:
+        raise ValueError(f"Métrica desconocida: {metric}. Opciones: {tuple(METRICS)}")
     nS, nT, nW = distributions.shape
     st_combinations = list(product(range(nS), range(nT)))
-    n_combinations = len(st_combinations)
-    
-    # Se crea una matriz para almacenar divergencias KL
-    kl_matrix = np.zeros((n_combinations, n_combinations))
-    
-    # Se calcula KL para cada par de combinaciones
-    for i, (s1, t1) in enumerate(st_combinations):
-        for j, (s2, t2) in enumerate(st_combinations):
-            if i != j:  # Evitar comparación consigo mismo
-                p = distributions[s1, t1]
-                q = distributions[s2, t2]
-                kl_matrix[i, j] = kl_divergence(p, q)
-    
-    return kl_matrix, st_combinations
+    flat = np.asarray(distributions, dtype=np.float64).reshape(nS * nT, nW)
+    matrix = _METRIC_FUNCTIONS[metric](flat, flat, block_size)
+    np.fill_diagonal(matrix, 0)  # Evitar comparación consigo mismo
+    return matrix, st_combinations
+
+# Calcular divergencia KL entre todas las combinaciones de (sentimiento, tópico)
+def compute_kl_for_all_combinations(distributions):
+    return divergence_matrix(distributions, "kl")
+
+
+def most_similar_pairs(matrix, k=50):
+    '''
+    Los k pares (i, j) con i != j de menor valor en la matriz, ordenados de
+    menor a mayor, seleccionados con argpartition sin ordenar toda la matriz.
+
+    Parameters
+    ----------
+    matrix : Matriz cuadrada de divergencias.
+    k : Número de pares.
+    '''
+    n = matrix.shape[0]
+    off_diagonal = ~np.eye(n, dtype=bool)
+    values = matrix[off_diagonal]
+    flat = np.flatnonzero(off_diagonal)
+    k = min(k, values.size)
+    if k == 0:
+        return []
+    top = np.argpartition(values, k - 1)[:k] if k < values.size else np.arange(values.size)
+    top = top[np.lexsort((flat[top], values[top]))]
+    return [divmod(int(index), n) for index in flat[top]]
 
 # Identificar combinaciones transversales
 def find_transversal_combinations(kl_matrix, st_combinations, aux_percentile=25):
     umbral = np.percentile(kl_matrix[kl_matrix > 0], aux_percentile) 
-    transversal_pairs = np.argwhere(kl_matrix < umbral)
-    transversal_pairs = [(i, j) for i, j in transversal_pairs if i != j] 
+    off_diagonal = ~np.eye(kl_matrix.shape[0], dtype=bool)
+    transversal_pairs = [tuple(pair) for pair in np.argwhere((kl_matrix < umbral) & off_diagonal)]
     return transversal_pairs, umbral
 
 
 if __name__ == "__main__":
-    distributions_last = results_stw.mean(axis=-1)  
+    metric = "kl"  # "kl", "js" o "hellinger"
+    name = METRICS[metric]
+
+    # Extraer las palabras
+    words = load_vocabulary("corpus")
+
+    # Leer los resultados (NPZ, HDF5 o JSON heredado) y promediar stw por bloques,
+    # corrigiendo ceros (para que no de error) y normalizando cada muestra
+    epsilon = 1e-10
+    with ResultsReader(" .npz") as reader:
+        check_vocabulary(reader.metadata, words)
+        distributions_last = reader.mean('stw', transform=lambda block: prepare_samples(block, epsilon))
 
-    # Calcular divergencia KL entre todas las combinaciones de (sentimiento, tópico)
-    print("Calculando divergencia KL entre combinaciones de (sentimiento, tópico)...")
-    kl_matrix, st_combinations = compute_kl_for_all_combinations(distributions_last)
+    print("Verificando normalización de las distribuciones...")
+    check_normalization(distributions_last)
+
+    # Calcular la divergencia entre todas las combinaciones de (sentimiento, tópico)
+    print(f"Calculando divergencia {name} entre combinaciones de (sentimiento, tópico)...")
+    kl_matrix, st_combinations = divergence_matrix(distributions_last, metric)
 
     # Identificar combinaciones transversales
     print("Identificando combinaciones transversales...")
@@ -92,42 +208,30 @@ if __name__ == "__main__":
     
     # Mostrar resultados
     print(f"Combinaciones transversales identificadas (índices): {transversal_pairs}")
-    print(f"Umbral de baja divergencia KL: {umbral}")
+    print(f"Umbral de baja divergencia {name}: {umbral}")
     print("Detalles de combinaciones transversales:")
     for i, j in transversal_pairs:
         s1, t1 = st_combinations[i]
         s2, t2 = st_combinations[j]
-        print(f"(Sentimiento {s1}, Tópico {t1}) <-> (Sentimiento {s2}, Tópico {t2}): KL={kl_matrix[i, j]:.4f}")
+        print(f"(Sentimiento {s1}, Tópico {t1}) <-> (Sentimiento {s2}, Tópico {t2}): {metric.upper()}={kl_matrix[i, j]:.4f}")
 
- # Graficar matriz de divergencia KL con escala logarítmica
+ # Graficar matriz de divergencia con escala logarítmica
     plt.figure(figsize=(14, 12))
 
     # Aplicar log(1 + x) para mejor visualización
     kl_log = np.log1p(kl_matrix)
-    
-    # Recoger divergencias no diagonales en lista
-    kl_entries = []
-
-    for i, (s1, t1) in enumerate(st_combinations):
-        for j, (s2, t2) in enumerate(st_combinations):
-            if i != j:
-                kl_entries.append((kl_log[i, j], f"S{s1+1}-T{t1+1}", f"S{s2+1}-T{t2+1}"))
-
-    # Ordenar por divergencia
-    kl_entries.sort()
-
-    # Mostrar las 50 más similares
-    print("\nTop 50 combinaciones más similares (log(1 + KL)):")
-    for val, label1, label2 in kl_entries[:50]:
-        print(f"{label1} <-> {label2}: log(1+KL) = {val:.4f}")
-
 
     # Crear etiquetas para los ejes como "S0-T1"
     labels = [f"S{s + 1}-T{t + 1}" for (s, t) in st_combinations]
 
+    # Mostrar las 50 más similares
+    print(f"\nTop 50 combinaciones más similares (log(1 + {metric.upper()})):")
+    for i, j in most_similar_pairs(kl_log, 50):
+        print(f"{labels[i]} <-> {labels[j]}: log(1+{metric.upper()}) = {kl_log[i, j]:.4f}")
+
     im = plt.imshow(kl_log, cmap="viridis", interpolation="nearest")
-    plt.colorbar(im, label="log(1 + KL Divergencia)")
-    plt.title("Matriz logarítmica de divergencia KL entre combinaciones (Sentimiento-Tópico)")
+    plt.colorbar(im, label=f"log(1 + {name} Divergencia)")
+    plt.title(f"Matriz logarítmica de divergencia {name} entre combinaciones (Sentimiento-Tópico)")
 
     plt.xticks(ticks=np.arange(len(labels)), labels=labels, rotation=90)
     plt.yticks(ticks=np.arange(len(labels)), labels=labels)
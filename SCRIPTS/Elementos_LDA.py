@@ -0,0 +1,84 @@
+"""
+Preparación de los datos necesarios para el modelo LDA (versión en Python de
+Elementos_LDA.R).
+
+Lee por bloques las reseñas filtradas y construye directamente la matriz
+documento-palabra en formato disperso (CSR), sin pasar por una matriz densa.
+Las columnas son las palabras en orden alfabético y los usuarios se codifican
+como enteros consecutivos desde 0 según el orden de sus user_id, igual que
+en R. El resultado se guarda con Corpus_LDA.save_corpus como archivos
+binarios que los modelos cargan con load_corpus.
+"""
+
+from array import array
+from collections import Counter
+import numpy as np
+from scipy import sparse
+
+from Corpus_LDA import save_corpus
+from Tablas_intermedias import iter_table
+
+
+def build_corpus(input_path, batch_size=100000):
+    '''
+    Construye la matriz documento-palabra CSR, las puntuaciones, los usuarios
+    codificados, el vocabulario y los user_id de cada código.
+
+    Parameters
+    ----------
+    input_path : str
+        Reseñas filtradas con las columnas user_id, rate y text (CSV o Parquet).
+    batch_size : int
+        Número de reseñas por bloque.
+    '''
+    word_code = {}
+    user_code = {}
+    indptr = array('q', [0])
+    indices = array('q')
+    data = array('d')
+    users = array('q')
+    rate = []
+
+    for chunk in iter_table(input_path, columns=['user_id', 'rate', 'text'], batch_size=batch_size):
+        for user_id, r, text in zip(chunk['user_id'], chunk['rate'], chunk['text']):
+            counts = Counter(text.split())
+            for word, count in counts.items():
+                indices.append(word_code.setdefault(word, len(word_code)))
+                data.append(count)
+            indptr.append(len(indices))
+            users.append(user_code.setdefault(user_id, len(user_code)))
+            rate.append(r)
+
+    # Palabras en orden alfabético, como las columnas de la TermDocumentMatrix
+    words = list(word_code)
+    order = sorted(range(len(words)), key=words.__getitem__)
+    new_code = np.empty(len(words), dtype=np.int64)
+    new_code[order] = np.arange(len(words))
+    vocabulary = [words[i] for i in order]
+
+    nD = len(indptr) - 1
+    dw = sparse.csr_matrix((np.frombuffer(data, dtype=np.float64),
+                            new_code[np.frombuffer(indices, dtype=np.int64)],
+                            np.frombuffer(indptr, dtype=np.int64)), shape=(nD, len(vocabulary)))
+    dw.sort_indices()
+
+    # Convertir user_id a enteros consecutivos desde 0, en el orden de as.factor
+    user_ids = list(user_code)
+    user_order = sorted(range(len(user_ids)), key=user_ids.__getitem__)
+    new_user = np.empty(len(user_ids), dtype=np.int64)
+    new_user[user_order] = np.arange(len(user_ids))
+    user = new_user[np.frombuffer(users, dtype=np.int64)]
+
+    return dw, np.asarray(rate), user, vocabulary, [user_ids[i] for i in user_order]
+
+
+if __name__ == "__main__":
+    # Reseñas filtradas (salida de Filtrado.py) y carpeta del corpus
+    input_path = " .csv"
+    corpus_dir = "corpus"
+
+    dw, rate, user, vocabulary, user_ids = build_corpus(input_path)
+    save_corpus(corpus_dir, dw, rate, user, vocabulary, user_ids)
+
+    print(f"Corpus guardado en {corpus_dir}: {dw.shape[0]} reseñas, {dw.shape[1]} palabras, "
+          f"{len(user_ids)} usuarios, {dw.nnz} entradas no nulas")
@@ -0,0 +1,182 @@
+"""
+Análisis y filtrado del vocabulario de las reseñas preprocesadas (versión en
+Python de Filtrado.R).
+
+Se calcula, para cada palabra, el número de reseñas en las que aparece y su
+proporción sobre el total de reseñas, y se eliminan las palabras poco
+frecuentes, las cortas, los nombres propios, las stopwords y las muy
+frecuentes (salvo excepciones). Los umbrales y las listas se leen de un
+archivo de configuración JSON (Filtrado_config.json).
+
+Las reseñas se leen por bloques dos veces: la primera para contar las
+frecuencias y la segunda para reconstruir el texto filtrado de cada reseña,
+de modo que la memoria solo depende del tamaño del vocabulario.
+"""
+
+import os
+import json
+from collections import Counter
+import pandas as pd
+
+from Tablas_intermedias import iter_table, write_table, TableWriter
+
+# Normalizar caracteres de las stopwords
+ACCENTS = str.maketrans("áéíóúàèìòùü", "aeiouaeiouu")
+
+
+def load_config(path):
+    '''
+    Lee el archivo de configuración del filtrado.
+
+    Parameters
+    ----------
+    path : str
+        Archivo JSON con min_prop, min_length, keep_short, max_prop,
+        keep_frequent, names, stopwords y extra_stopwords.
+    '''
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def load_stopwords(spec):
+    '''
+    Devuelve el conjunto de stopwords sin tildes.
+
+    Parameters
+    ----------
+    spec : str o list
+        "stopwords-iso" para usar la lista en inglés de stopwords-iso (como
+        en R, requiere el paquete stopwordsiso), la ruta de un archivo con una
+        palabra por línea o directamente una lista de palabras.
+    '''
+    if isinstance(spec, list):
+        words = spec
+    elif spec == "stopwords-iso":
+        try:
+            import stopwordsiso
+        except ImportError:
+            raise ImportError("Se requiere stopwordsiso para usar las stopwords de stopwords-iso.")
+        words = stopwordsiso.stopwords("en")
+    else:
+        with open(spec, encoding='utf-8') as f:
+            words = [line.strip() for line in f if line.strip()]
+    return {word.translate(ACCENTS) for word in words}
+
+
+def tokenize(text):
+    '''
+    Tokeniza el texto separando por espacios.
+
+    Parameters
+    ----------
+    text : str
+        Texto preprocesado de una reseña.
+    '''
+    return text.split(" ") if isinstance(text, str) else []
+
+
+def document_frequencies(path, batch_size=100000):
+    '''
+    Cuenta en cuántas reseñas aparece cada palabra. Devuelve el conteo y el
+    número de reseñas.
+
+    Parameters
+    ----------
+    path : str
+        Archivo de reseñas preprocesadas (CSV o Parquet).
+    batch_size : int
+        Número de reseñas por bloque.
+    '''
+    freq = Counter()
+    nreview = 0
+    for data in iter_table(path, columns=['text'], batch_size=batch_size):
+        for text in data['text']:
+            freq.update(set(tokenize(text)))
+            nreview += 1
+    return freq, nreview
+
+
+def vocabulary_filter(freq, nreview, config):
+    '''
+    Aplica los filtros de la configuración. Devuelve las frecuencias de todas
+    las palabras (token, freq, prop) y las de las palabras que se conservan.
+
+    Parameters
+    ----------
+    freq : Counter
+        Número de reseñas en las que aparece cada palabra.
+    nreview : int
+        Número de reseñas.
+    config : dict
+        Configuración del filtrado (ver load_config).
+    '''
+    freq_corpus = pd.DataFrame(sorted(freq.items()), columns=['token', 'freq'])
+    freq_corpus['prop'] = freq_corpus['freq'] / nreview
+
+    stopw = load_stopwords(config['stopwords'])
+    token = freq_corpus['token']
+    prop = freq_corpus['prop']
+
+    # Eliminar palabras poco frecuentes
+    keep = prop >= config['min_prop']
+    # Filtrado adicional por longitud mínima (salvo las palabras de keep_short)
+    keep &= ~((token.str.len() < config['min_length']) & ~token.isin(config['keep_short']))
+    # Eliminar los nombres propios de la lista
+    keep &= ~token.isin(config['names'])
+    # Eliminar stopwords en inglés
+    keep &= ~token.isin(stopw)
+    # Eliminar las palabras muy frecuentes, salvo excepciones significativas
+    keep &= ~((prop > config['max_prop']) & ~token.isin(config['keep_frequent']))
+    # Eliminar stopwords adicionales específicas
+    keep &= ~token.isin(config['extra_stopwords'])
+
+    return freq_corpus, freq_corpus[keep].reset_index(drop=True)
+
+
+def filter_reviews(input_path, output_path, config, batch_size=100000, stats_dir=None):
+    '''
+    Filtra el vocabulario de las reseñas y guarda cada reseña con solo las
+    palabras conservadas, en su orden original. Las reseñas sin ninguna
+    palabra conservada se eliminan. Devuelve el vocabulario conservado.
+
+    Parameters
+    ----------
+    input_path : str
+        Reseñas preprocesadas (id, user_id, book_id, rate, date_added, text).
+    output_path : str
+        Archivo de salida con las mismas columnas (CSV o Parquet).
+    config : dict
+        Configuración del filtrado (ver load_config).
+    batch_size : int
+        Número de reseñas por bloque.
+    stats_dir : str, opcional
+        Carpeta donde guardar las frecuencias (freq_corpus.csv y freq_filter.csv).
+    '''
+    freq, nreview = document_frequencies(input_path, batch_size)
+    freq_corpus, freq_filter = vocabulary_filter(freq, nreview, config)
+    vocabulary = set(freq_filter['token'])
+
+    if stats_dir is not None:
+        os.makedirs(stats_dir, exist_ok=True)
+        write_table(freq_corpus, os.path.join(stats_dir, 'freq_corpus.csv'))
+        write_table(freq_filter, os.path.join(stats_dir, 'freq_filter.csv'))
+
+    # Reconstrucción del texto filtrado por reseña
+    with TableWriter(output_path) as writer:
+        for data in iter_table(input_path, batch_size=batch_size):
+            data = data.assign(text=[" ".join(token for token in tokenize(text) if token in vocabulary)
+                                     for text in data['text']])
+            data = data[data['text'] != ""]
+            writer.write(data[['id', 'user_id', 'book_id', 'rate', 'date_added', 'text']])
+
+    return vocabulary
+
+
+if __name__ == "__main__":
+    # Reseñas preprocesadas (id, user_id, book_id, rate, date_added, text) y salida, en CSV o Parquet
+    input_path = " .csv"
+    output_path = " .csv"
+    config = load_config("Filtrado_config.json")
+
+    vocabulary = filter_reviews(input_path, output_path, config, stats_dir="Frecuencias")
+    print(f"Vocabulario filtrado: {len(vocabulary)} palabras")
@@ -0,0 +1,322 @@
+# -*- coding: utf-8 -*-
+"""
+Filtrado de reseñas por género a partir del archivo de géneros de libros.
+
+Lee el archivo de géneros una vez para saber qué libros pertenecen a cada uno
+de los géneros pedidos y después recorre el archivo de reseñas una sola vez,
+escribiendo cada reseña directamente en el CSV de cada género al que
+pertenece su libro. Así se pueden extraer varios géneros (p.ej.
+'fantasy, paranormal' y 'comics, graphic') con una única lectura.
+
+Con shard_genres se reparten en una sola lectura las reseñas de todos los
+géneros (o de los indicados), con un archivo CSV o una partición Parquet por
+género, y se obtiene el número de reseñas de cada uno.
+
+Las líneas se leen con orjson si está instalado y con json si no lo está.
+Parquet requiere pyarrow.
+"""
+
+import ast
+import csv
+import json
+import os
+import re
+
+from Tablas_intermedias import table_format
+
+try:
+    import orjson
+    _loads = orjson.loads
+    _DecodeError = orjson.JSONDecodeError
+except ImportError:
+    _loads = json.loads
+    _DecodeError = json.JSONDecodeError
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Campos de las reseñas que se guardan en el CSV
+FIELDNAMES = ['user_id', 'book_id', 'rating', 'review_text', 'date_added']
+
+SHARD_FORMATS = ("csv", "parquet")
+
+
+def parse_line(line):
+    '''
+    Convierte una línea del archivo en un diccionario. Si la línea no es JSON
+    válido (p.ej. un diccionario de Python con comillas simples), se usa
+    ast.literal_eval como antes.
+
+    Parameters
+    ----------
+    line : bytes
+        Línea del archivo.
+    '''
+    try:
+        return _loads(line)
+    except (_DecodeError, ValueError):
+        return ast.literal_eval(line.decode('utf-8'))
+
+
+def read_lines(path):
+    '''
+    Devuelve los registros de un archivo con un diccionario por línea,
+    saltando las líneas vacías.
+
+    Parameters
+    ----------
+    path : str
+        Archivo de entrada.
+    '''
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield parse_line(line)
+
+
+def book_genres(genres_path, genre_keys=None):
+    '''
+    Devuelve un diccionario book_id -> géneros del libro.
+
+    Parameters
+    ----------
+    genres_path : str
+        Archivo de géneros de libros.
+    genre_keys : list, opcional
+        Géneros que interesan. Si se indica, solo se guardan esos géneros y
+        los libros que tienen alguno de ellos.
+    '''
+    wanted = None if genre_keys is None else set(genre_keys)
+    books = {}
+    for registro in read_lines(genres_path):
+        genres = registro.get('genres', {})
+        if wanted is not None:
+            genres = [genre for genre in genres if genre in wanted]
+        if genres:
+            books[registro['book_id']] = tuple(genres)
+    return books
+
+
+def genre_slug(genre):
+    '''
+    Nombre de archivo de un género, p.ej. 'fantasy, paranormal' -> 'fantasy_paranormal'.
+    '''
+    return re.sub(r'[^a-z0-9]+', '_', genre.lower()).strip('_')
+
+
+class CsvShards:
+    def __init__(self, outputs):
+        '''
+        Un CSV por género, con la cabecera de FIELDNAMES.
+
+        Parameters
+        ----------
+        outputs : dict
+            Género -> archivo CSV de salida.
+        '''
+        self.files = {}
+        self.writers = {}
+        try:
+            for genre, path in outputs.items():
+                self.files[genre] = open(path, 'w', encoding='utf-8', newline='')
+                self.writers[genre] = csv.DictWriter(self.files[genre], fieldnames=FIELDNAMES,
+                                                     extrasaction='ignore')
+                self.writers[genre].writeheader()
+        except Exception:
+            self.close()
+            raise
+
+    def write(self, genre, review):
+        self.writers[genre].writerow(review)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+class ParquetShards:
+    # Esquema fijo de las reseñas
+    SCHEMA = None if pa is None else pa.schema([
+        ('user_id', pa.string()), ('book_id', pa.string()), ('rating', pa.int64()),
+        ('review_text', pa.string()), ('date_added', pa.string())])
+
+    def __init__(self, outputs, batch_rows=100000):
+        '''
+        Un archivo Parquet por género. Las reseñas se acumulan por género y se
+        escriben en grupos de batch_rows filas.
+
+        Parameters
+        ----------
+        outputs : dict
+            Género -> archivo Parquet de salida.
+        batch_rows : int
+            Número de filas por grupo.
+        '''
+        if pa is None:
+            raise ImportError("Se requiere pyarrow para guardar las reseñas en Parquet.")
+        self.batch_rows = batch_rows
+        self.buffers = {genre: [] for genre in outputs}
+        self.writers = {}
+        try:
+            for genre, path in outputs.items():
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                self.writers[genre] = pq.ParquetWriter(path, self.SCHEMA)
+        except Exception:
+            self.close()
+            raise
+
+    def write(self, genre, review):
+        buffer = self.buffers[genre]
+        buffer.append(review)
+        if len(buffer) >= self.batch_rows:
+            self._flush(genre)
+
+    def _flush(self, genre):
+        buffer = self.buffers[genre]
+        if not buffer:
+            return
+        columns = {}
+        for field in self.SCHEMA:
+            values = [review.get(field.name) for review in buffer]
+            if field.type == pa.string():
+                values = [None if v is None else str(v) for v in values]
+            columns[field.name] = pa.array(values, type=field.type)
+        self.writers[genre].write_table(pa.table(columns, schema=self.SCHEMA))
+        buffer.clear()
+
+    def close(self):
+        for genre, writer in self.writers.items():
+            self._flush(genre)
+            writer.close()
+
+
+def split_reviews(books, reviews_path, shards, counts):
+    '''
+    Recorre una vez el archivo de reseñas y escribe cada reseña en los
+    fragmentos de los géneros de su libro, contando las reseñas por género.
+
+    Parameters
+    ----------
+    books : dict
+        book_id -> géneros del libro (ver book_genres).
+    reviews_path : str
+        Archivo de reseñas.
+    shards : CsvShards o ParquetShards
+        Salida de cada género.
+    counts : dict
+        Género -> número de reseñas; se actualiza en el sitio.
+    '''
+    for review in read_lines(reviews_path):
+        for genre in books.get(review.get('book_id'), ()):
+            shards.write(genre, review)
+            counts[genre] += 1
+    return counts
+
+
+def filter_genres(genres_path, reviews_path, outputs):
+    '''
+    Filtra las reseñas de uno o varios géneros con una sola lectura del
+    archivo de reseñas y guarda las de cada género en su archivo. Devuelve el
+    número de reseñas guardadas por género.
+
+    Parameters
+    ----------
+    genres_path : str
+        Archivo de géneros de libros.
+    reviews_path : str
+        Archivo de reseñas.
+    outputs : dict
+        Género -> archivo de salida, CSV o Parquet (si todos tienen extensión .parquet).
+    '''
+    books = book_genres(genres_path, outputs.keys())
+    counts = {genre: 0 for genre in outputs}
+
+    if outputs and all(table_format(path) == "parquet" for path in outputs.values()):
+        shards = ParquetShards(outputs)
+    else:
+        shards = CsvShards(outputs)
+    try:
+        split_reviews(books, reviews_path, shards, counts)
+    finally:
+        shards.close()
+    return counts
+
+
+def shard_genres(genres_path, reviews_path, output_dir, genre_keys=None, file_format="csv"):
+    '''
+    Reparte las reseñas por género con una sola lectura del archivo de
+    reseñas. Con formato csv se escribe output_dir/<género>.csv; con parquet,
+    una partición output_dir/genre=<género>/part-0.parquet por género. El
+    número de reseñas de cada género se devuelve y se guarda en
+    output_dir/_counts.json (con el prefijo _, pyarrow lo ignora al leer las
+    particiones).
+
+    Parameters
+    ----------
+    genres_path : str
+        Archivo de géneros de libros.
+    reviews_path : str
+        Archivo de reseñas.
+    output_dir : str
+        Carpeta de salida.
+    genre_keys : list, opcional
+        Géneros a extraer (por defecto, todos los del archivo de géneros).
+    file_format : str
+        "csv" o "parquet".
+    '''
+    if file_format not in SHARD_FORMATS:
+        raise ValueError(f"Formato desconocido: {file_format}. Opciones: {SHARD_FORMATS}")
+
+    books = book_genres(genres_path, genre_keys)
+    genres = sorted({genre for genres in books.values() for genre in genres} | set(genre_keys or ()))
+
+    os.makedirs(output_dir, exist_ok=True)
+    if file_format == "csv":
+        outputs = {genre: os.path.join(output_dir, genre_slug(genre) + '.csv') for genre in genres}
+        shards = CsvShards(outputs)
+    else:
+        outputs = {genre: os.path.join(output_dir, 'genre=' + genre_slug(genre), 'part-0.parquet')
+                   for genre in genres}
+        shards = ParquetShards(outputs)
+
+    counts = {genre: 0 for genre in genres}
+    try:
+        split_reviews(books, reviews_path, shards, counts)
+    finally:
+        shards.close()
+
+    summary = {genre: {'file': os.path.relpath(outputs[genre], output_dir), 'rows': counts[genre]}
+               for genre in genres}
+    with open(os.path.join(output_dir, '_counts.json'), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=4)
+    return counts
+
+
+if __name__ == "__main__":
+    # Archivos de entrada
+    genres_path = '.json'
+    reviews_path = '.json'
+
+    # Con shard_all, se reparten todas las reseñas por género en output_dir;
+    # si no, se extraen solo los géneros de outputs con su CSV de salida
+    shard_all = False
+    output_dir = 'generos'
+    file_format = 'csv'  # 'csv' o 'parquet'
+    outputs = {
+        'fantasy, paranormal': '.csv',
+        'comics, graphic': '.csv',
+    }
+
+    if shard_all:
+        counts = shard_genres(genres_path, reviews_path, output_dir, file_format=file_format)
+        for genre, count in counts.items():
+            print(f"{genre}: {count} reviews")
+        print(f"Reseñas repartidas por género en {output_dir}")
+    else:
+        counts = filter_genres(genres_path, reviews_path, outputs)
+        for genre, count in counts.items():
+            print(f"Se ha creado el fichero CSV con {count} reviews de libros de la categoría '{genre}'.")
@@ -1,63 +1,232 @@
 # -*- coding: utf-8 -*-
 """
-Este script toma las reseñas en inglés y las cruza con la información 
+Este script toma las reseñas en inglés y las cruza con la información
 de géneros por libro. Calcula estadísticas por género, incluyendo:
 - Total de reseñas
 - Número de usuarios distintos
 - Usuarios más activos por género
 - Cantidad de usuarios con más de 1000 reseñas en un solo género
+
+Las reseñas se leen línea a línea. Cada user_id se guarda una sola vez y se
+sustituye por un código entero; los conteos por usuario y género se acumulan
+por bloques en una matriz dispersa usuarios x géneros. Con distinct="hll" y
+sin usuarios más activos (top_k=None), el número de usuarios distintos se
+aproxima con HyperLogLog y la memoria no depende del número de usuarios.
 """
 
 import json
-from collections import defaultdict, Counter
-
-reviews = '.json'
-generos = '.json' 
-
-# Cargar los datos de los archivos JSON
-with open(reviews, 'r', encoding='utf-8') as f:
-    reviews = [json.loads(line) for line in f]
-
-with open(generos, 'r', encoding='utf-8') as f:
-    genres = [json.loads(line) for line in f]
-
-# Crear un diccionario para mapear book_id a sus géneros
-book_genres = {}
-for entry in genres:
-    book_genres[entry['book_id']] = list(entry['genres'].keys())
-
-# Crear estructuras para contar reviews y usuarios por género
-genre_review_count = defaultdict(int)
-genre_user_count = defaultdict(set)
-genre_user_reviews = defaultdict(Counter)
-
-# Procesar las reseñas
-for review in reviews:
-    book_id = review['book_id']
-    user_id = review['user_id']
-    
-    if book_id in book_genres:
-        for genre in book_genres[book_id]:
-            genre_review_count[genre] += 1
-            genre_user_count[genre].add(user_id)
-            genre_user_reviews[genre][user_id] += 1
-
-# Preparar los resultados
-results = []
-for genre, count in genre_review_count.items():
-    top_500_users = genre_user_reviews[genre].most_common(500)
-    users_with_more_than_1000_reviews = sum(1 for user, review_count in genre_user_reviews[genre].items() if review_count > 1000)
-    results.append({
-        'genre': genre,
-        'review_count': count,
-        'distinct_user_count': len(genre_user_count[genre]),
-        'top_500_users': [{'user_id': user, 'review_count': review_count} for user, review_count in top_500_users],
-        'users_with_more_than_1000_reviews': users_with_more_than_1000_reviews
-    })
-
-# Guardar en un archivo JSON
-output_file = '.json'
-with open(output_file, 'w', encoding='utf-8') as f:
-    json.dump(results, f, indent=4)
-
-print(f"El archivo de resumen se ha guardado en {output_file}")
+import hashlib
+import numpy as np
+from scipy import sparse
+
+from Filtro_generos import book_genres, read_lines
+
+
+class HyperLogLog:
+    def __init__(self, ncounters, p=14):
+        '''
+        ncounters contadores HyperLogLog de 2**p registros cada uno, para
+        aproximar el número de elementos distintos (error típico 1.04 / sqrt(2**p)).
+
+        Parameters
+        ----------
+        ncounters : int
+            Número de contadores (uno por género).
+        p : int
+            Bits del índice de registro.
+        '''
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros((ncounters, self.m), dtype=np.uint8)
+
+    @staticmethod
+    def hash(value):
+        '''Hash de 64 bits de una cadena.'''
+        return int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'little')
+
+    def add(self, counters, hashes):
+        '''
+        Añade los hashes a los contadores indicados.
+
+        Parameters
+        ----------
+        counters : np.ndarray
+            Contador de cada hash.
+        hashes : np.ndarray
+            Hashes de 64 bits (uint64).
+        '''
+        q = 64 - self.p
+        idx = (hashes >> np.uint64(q)).astype(np.int64)
+        rest = hashes & np.uint64((1 << q) - 1)
+        # Posición del primer bit a 1 en los q bits restantes (q + 1 si son todos 0)
+        _, exponent = np.frexp(rest.astype(np.float64))
+        rank = np.where(rest == 0, q + 1, q - exponent + 1).astype(np.uint8)
+        np.maximum.at(self.registers, (counters, idx), rank)
+
+    def estimate(self):
+        '''Número aproximado de elementos distintos de cada contador.'''
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64), axis=1)
+        zeros = np.sum(self.registers == 0, axis=1)
+        # Corrección para cardinalidades pequeñas (conteo lineal)
+        small = (raw <= 2.5 * m) & (zeros > 0)
+        linear = m * np.log(m / np.maximum(zeros, 1))
+        return np.where(small, linear, raw)
+
+
+def genre_stats(reviews_path, genres_path, top_k=500, min_reviews=1000, distinct="exact", chunk_size=1000000):
+    '''
+    Calcula las estadísticas por género con una lectura en streaming del
+    archivo de reseñas.
+
+    Parameters
+    ----------
+    reviews_path : str
+        Archivo de reseñas (una por línea).
+    genres_path : str
+        Archivo de géneros de libros.
+    top_k : int
+        Número de usuarios más activos por género. Con None no se guardan
+        conteos por usuario (ni usuarios más activos ni usuarios con más de
+        min_reviews reseñas).
+    min_reviews : int
+        Umbral de reseñas en un género para contar un usuario.
+    distinct : str
+        "exact" cuenta los usuarios distintos a partir de los conteos por
+        usuario; "hll" los aproxima con HyperLogLog.
+    chunk_size : int
+        Número de pares (usuario, género) acumulados antes de sumarlos a la matriz.
+    '''
+    if distinct not in ("exact", "hll"):
+        raise ValueError(f"Conteo desconocido: {distinct}. Opciones: ('exact', 'hll')")
+    if distinct == "exact" and top_k is None:
+        raise ValueError("El conteo exacto de usuarios distintos necesita los conteos por usuario (top_k)")
+    per_user = top_k is not None
+
+    # Crear un diccionario para mapear book_id a los códigos de sus géneros
+    books = book_genres(genres_path)
+    genre_names = sorted({genre for genres in books.values() for genre in genres})
+    genre_code = {genre: g for g, genre in enumerate(genre_names)}
+    books = {book_id: tuple(genre_code[genre] for genre in genres) for book_id, genres in books.items()}
+    nG = len(genre_names)
+
+    user_code = {}
+    user_names = []
+    counts = sparse.csr_matrix((0, nG), dtype=np.int64)
+    # Primera reseña (más uno) de cada usuario en cada género, para desempatar como Counter
+    first_review = sparse.csr_matrix((0, nG), dtype=np.int64)
+    review_count = np.zeros(nG, dtype=np.int64)
+    genre_order = []
+    hll = HyperLogLog(nG) if distinct == "hll" else None
+
+    users_buf, genres_buf, hashes_buf, index_buf = [], [], [], []
+
+    def flush():
+        nonlocal counts, first_review
+        if not genres_buf:
+            return
+        genres = np.array(genres_buf, dtype=np.int64)
+        review_count[:] += np.bincount(genres, minlength=nG)
+        if per_user:
+            users = np.array(users_buf, dtype=np.int64)
+            index = np.array(index_buf, dtype=np.int64)
+            shape = (len(user_names), nG)
+            block = sparse.csr_matrix((np.ones(len(users), dtype=np.int64), (users, genres)), shape=shape)
+
+            # Primera aparición de cada par (usuario, género) en el bloque
+            keys = users * nG + genres
+            order = np.lexsort((index, keys))
+            first = order[np.r_[True, keys[order][1:] != keys[order][:-1]]]
+            block_first = sparse.csr_matrix((index[first] + 1, (users[first], genres[first])), shape=shape)
+
+            counts.resize(shape)
+            first_review.resize(shape)
+            # Solo cuenta la primera aparición de los pares que no estaban ya
+            first_review = first_review + block_first - block_first.multiply(counts > 0)
+            counts = counts + block
+        if hll is not None:
+            hll.add(genres, np.array(hashes_buf, dtype=np.uint64))
+        users_buf.clear()
+        genres_buf.clear()
+        hashes_buf.clear()
+        index_buf.clear()
+
+    # Procesar las reseñas
+    for i, review in enumerate(read_lines(reviews_path)):
+        genres = books.get(review['book_id'])
+        if not genres:
+            continue
+        # Orden de aparición de los géneros, como en el resumen original
+        if len(genre_order) < nG:
+            genre_order.extend(g for g in genres if g not in genre_order)
+        user_id = review['user_id']
+
+        if per_user:
+            u = user_code.get(user_id)
+            if u is None:
+                u = user_code[user_id] = len(user_names)
+                user_names.append(user_id)
+            users_buf.extend([u] * len(genres))
+            index_buf.extend([i] * len(genres))
+        if hll is not None:
+            hashes_buf.extend([HyperLogLog.hash(user_id)] * len(genres))
+        genres_buf.extend(genres)
+
+        if len(genres_buf) >= chunk_size:
+            flush()
+    flush()
+
+    if per_user:
+        counts = counts.tocsc()
+        counts.sort_indices()
+        first_review = first_review.tocsc()
+        first_review.sort_indices()
+        distinct_users = np.diff(counts.indptr)
+    if hll is not None:
+        distinct_users = np.rint(hll.estimate()).astype(np.int64)
+
+    # Preparar los resultados, en el orden en que aparece cada género en las reseñas
+    results = []
+    for g in genre_order:
+        result = {
+            'genre': genre_names[g],
+            'review_count': int(review_count[g]),
+            'distinct_user_count': int(distinct_users[g]),
+        }
+        if per_user:
+            users = counts.indices[counts.indptr[g]:counts.indptr[g + 1]]
+            user_reviews = counts.data[counts.indptr[g]:counts.indptr[g + 1]]
+            first = first_review.data[counts.indptr[g]:counts.indptr[g + 1]]
+            # Usuarios más activos; a igual número de reseñas, por orden de aparición en el género
+            if len(users) > top_k:
+                kth = np.partition(user_reviews, len(users) - top_k)[len(users) - top_k]
+                top = np.flatnonzero(user_reviews >= kth)
+            else:
+                top = np.arange(len(users))
+            top = top[np.lexsort((first[top], -user_reviews[top]))][:top_k]
+            result[f'top_{top_k}_users'] = [{'user_id': user_names[users[j]], 'review_count': int(user_reviews[j])}
+                                            for j in top]
+            result[f'users_with_more_than_{min_reviews}_reviews'] = int(np.sum(user_reviews > min_reviews))
+        results.append(result)
+
+    return results
+
+
+if __name__ == "__main__":
+    reviews = '.json'
+    generos = '.json'
+
+    # Parámetros (cambiar a los deseados)
+    top_k = 500          # None para no guardar conteos por usuario
+    min_reviews = 1000
+    distinct = "exact"   # "hll" para aproximar los usuarios distintos con memoria constante
+
+    results = genre_stats(reviews, generos, top_k=top_k, min_reviews=min_reviews, distinct=distinct)
+
+    # Guardar en un archivo JSON
+    output_file = '.json'
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=4)
+
+    print(f"El archivo de resumen se ha guardado en {output_file}")
@@ -2,14 +2,19 @@
 Este script implementa un modelo LDA que incorpora sentimientos por documento y
 usuarios. Usa Gibbs Sampling colapsado para la inferencia de tópicos y distribuciones.
 
-Los resultados se guardan en un archivo JSON.
+Los resultados se guardan en un archivo binario comprimido (NPZ/HDF5) o, de
+forma heredada, en un archivo JSON. Durante el muestreo se registran cada
+nupdate iteraciones los diagnósticos de convergencia (Diagnosticos_LDA.py).
 """
 
 import datetime
 import numpy as np
-import pandas as pd
 from scipy.special import loggamma
 import math
+from Corpus_LDA import to_csr, doc_words, load_corpus
+from Nucleo_Gibbs import resolve_engine, run_sweep, compute_counts
+from Resultados_LDA import save_results, vocabulary_hash, make_store, normalize_counts
+from Diagnosticos_LDA import ConvergenceMonitor, burn_in_end
 
 
 
@@ -20,19 +25,32 @@ class sentiment_stLDA:
         nT (int): número de tópicos
         rate (array): calificaciones (sentimientos) por documento
         user (array): usuarios por documento
-        matrix_words (2D array): matriz documento-palabra
+        matrix_words (2D array, sparse o list): matriz documento-palabra, densa,
+            dispersa de scipy o lista de índices de palabras por documento
+        nW (int): tamaño del vocabulario si matrix_words es una lista de índices
+        engine (str): motor de muestreo, "numpy" o "numba" (compilado); si numba
+            no está instalado se usa NumPy
+        vocabulary (list): palabras (columnas de matrix_words), se guarda su hash
+            en los metadatos de los resultados
     """
 
-    def __init__(self, nT=None, rate=None, user=None, matrix_words=None, seed=None):
+    def __init__(self, nT=None, rate=None, user=None, matrix_words=None, seed=None, nW=None,
+                 engine="numpy", vocabulary=None):
         self.nT = nT
         self.rate = rate
         self.users = user
-        self.dw = matrix_words
         self.seed = seed
+        self.engine = resolve_engine(engine)
+        self.vocabulary_hash = vocabulary_hash(vocabulary) if vocabulary is not None else None
+        self.params = {}
 
         # Validar que los datos se pasen correctamente
         if rate is None or user is None or matrix_words is None:
             raise ValueError("Se requieren rate, user y matrix_words para inicializar el modelo.")
+
+        # Matriz documento-palabra en formato disperso (CSR)
+        self.dw = to_csr(matrix_words, nW)
+        self.nwd = np.asarray(self.dw.sum(axis=1)).ravel()  # Número de palabras por documento
         
         
         # Mapear sentimientos directamente sin categorizarlos
@@ -56,39 +74,39 @@ class sentiment_stLDA:
         np.random.seed(self.seed)
         ta = np.random.choice(np.arange(self.nT), replace = True, size = self.nD)
 
-        ust = np.zeros([self.nU, self.nS, self.nT])
-        for u in range(self.nU):
-            for s in range(self.nS):
-                for t in range(self.nT):
-                    ust[u, s, t] = np.sum( (self.users == u) & (self.sa_true == s) & (ta == t) )
-
-        stw = np.zeros([self.nS, self.nT, self.nW])
-        for s in range(self.nS):
-            for t in range(self.nT):
-                stw[s,t,:] = np.sum( self.dw[(self.sa_true == s) & 
-                                            (ta == t)], axis=0 )
+        ust, stw = compute_counts(self.dw, self.users, self.sa_true, ta, self.nU, self.nS, self.nT)
 
         return ta, ust, stw
 
 
     def iter_collapse_gibbs_sampler(self, ta, ust, stw, alpha=0.01, eta=0.01):
 
+        if self.engine == "numba":
+            return run_sweep(self.dw, self.nwd, self.users, self.sa_true, ta, ust, stw, alpha, eta)
+
+        # totales por fila (s, t) de stw, se actualizan al mover cada documento
+        stw_tot = np.sum(stw, axis=2)
+
         for d in range(self.nD):
                 # Obtención del estado actual de cocumento d
                 u = self.users[d]
                 s = self.sa_true[d]
                 t = ta[d]
+                cols, cnts = doc_words(self.dw, d)
 
                 # se elimina del conteo
                 ust[u,s,t] -= 1
-                stw[s,t]   -= self.dw[d,]
+                stw[s,t,cols] -= cnts
+                stw_tot[s,t]  -= self.nwd[d]
 
                 # se calculan las probabilidades
                 us_to_t = np.log( (alpha + ust[u, s]) / (self.nT * alpha + np.sum(ust[u, s]) ) )
-                w_to_t  = loggamma( np.sum( stw[s,] + eta, axis = 1) ) 
-                w_to_t -= np.sum( loggamma( stw[s,] + eta ), axis=1)
-                w_to_t += np.sum( loggamma(stw[s,] + eta + self.dw[d,]), axis=1 )
-                w_to_t -= loggamma( np.sum( stw[s,] + eta, axis=1 ) + np.sum(self.dw[d]) )
+                # las columnas en las que el documento no aparece se cancelan,
+                # por lo que solo se evalúan las columnas no nulas
+                tot_eta = stw_tot[s] + self.nW * eta
+                stw_eta = stw[s][:,cols] + eta
+                w_to_t  = loggamma( tot_eta ) - loggamma( tot_eta + self.nwd[d] )
+                w_to_t += np.sum( loggamma( stw_eta + cnts ) - loggamma( stw_eta ), axis=1 )
                 probs = np.exp((us_to_t + w_to_t) - np.max(us_to_t + w_to_t))
                 probs /= np.sum(probs)
 
@@ -97,45 +115,70 @@ class sentiment_stLDA:
                 # se añaden los conteos
                 ta[d] = t_new
                 ust[u,s,t_new] += 1
-                stw[s,t_new,] += self.dw[d,]
+                stw[s,t_new,cols] += cnts
+                stw_tot[s,t_new]  += self.nwd[d]
 
         return ta, ust, stw
 
 
     def collapse_gibbs_sampler(self, niter=None, nburnin=None, nthin=None, 
-        nupdate=None, alpha= None, eta=None):
-
+        nupdate=None, alpha= None, eta=None, storage="all", storage_size=None, storage_dir=None,
+        diagnostics_path="diagnosticos.csv", early_stop=False, stop_tol=1e-3,
+        stop_prop_tol=0.01, stop_patience=3):
+        # storage: política de almacenamiento de las muestras, "all" (todas en memoria),
+        # "mean" (media y varianza), "reservoir" (reserva de storage_size muestras)
+        # o "memmap" (todas en disco, en storage_dir)
+        # diagnostics_path: CSV con los diagnósticos de convergencia registrados cada
+        # nupdate iteraciones (None para no guardarlos)
+        # early_stop: terminar el calentamiento cuando los diagnósticos se estabilizan
+        # (ver Diagnosticos_LDA.ConvergenceMonitor para stop_tol, stop_prop_tol y stop_patience)
+
+        self.params = {"niter": niter, "nburnin": nburnin, "nthin": nthin,
+                       "alpha": alpha, "eta": eta, "storage": storage, "early_stop": early_stop}
         ta, ust, stw = self.init_collapse_gibbs_sampler()
+        monitor = ConvergenceMonitor(self.sa_true, self.nS, self.nT, diagnostics_path, stop_tol=stop_tol,
+                                     stop_prop_tol=stop_prop_tol, stop_patience=stop_patience)
                 
         nsaved = np.floor(niter/nthin).astype(int) - 1
-        results_ust = np.zeros([self.nU, self.nS, self.nT, nsaved]) 
-        results_stw = np.zeros([self.nS, self.nT, self.nW, nsaved]) 
-        results_ta  = np.zeros([self.nD, nsaved]) 
+        shapes = {"ust": (self.nU, self.nS, self.nT), "stw": (self.nS, self.nT, self.nW), "ta": (self.nD,)}
+        samples = make_store(storage, shapes, nsaved, nT=self.nT, size=storage_size,
+                             directory=storage_dir, seed=self.seed)
 
         iter_start = datetime.datetime.now()
         for i in range(niter+nburnin):
+            if i >= niter + nburnin:
+                break  # Calentamiento acortado con early_stop
             
             ta, ust, stw = self.iter_collapse_gibbs_sampler(ta, ust, stw, alpha, eta)
                 
             if (i > nburnin) & (i % nthin == 0) :
                 idx = ((i - nburnin) // nthin) - 1
-                for s in range(self.nS):
-                    results_ust[:,s,:,idx] = np.apply_along_axis(lambda x: 
-                                                                x/np.sum(x), arr=ust[:,s,:], axis=1)
-                    
-                    results_stw[s,:,:,idx] = np.apply_along_axis(lambda x: 
-                                                                x/np.sum(x), arr=stw[s], axis=1)
-
-                results_ta[:,idx] = ta
+                samples.add(idx, {"ust": normalize_counts(ust), "stw": normalize_counts(stw), "ta": ta})
                     
             if (i % nupdate) == 0:
                 print(f'Acabada iter {i} en tiempo {datetime.datetime.now()}')
                 print(f'Tiempo por iter: {datetime.datetime.now() - iter_start}')
+                monitor.update(i, ta, ust, stw, alpha, eta)
+                print(f'Diagnósticos: {monitor.summary()}')
+                if early_stop and i < nburnin and monitor.converged() and burn_in_end(i, nthin) < nburnin:
+                    nburnin = burn_in_end(i, nthin)
+                    self.params.update(nburnin=nburnin, nburnin_requested=self.params["nburnin"])
+                    print(f'Diagnósticos estables: el calentamiento termina en la iter {nburnin}')
                 iter_start = datetime.datetime.now()
 
-        self.results_ust = results_ust #Distribución de sentimientos por usuario y tópico
-        self.results_stw = results_stw #Distribución de palabras por sentimiento y tópico
-        self.results_ta  = results_ta  #Asignaciones de tópicos a documentos a lo largo de las iteraciones.
+        monitor.close()
+        self.diagnostics = monitor.history
+
+        self.results = samples.results()
+        self.results_ust = self.results["ust"] #Distribución de sentimientos por usuario y tópico
+        self.results_stw = self.results["stw"] #Distribución de palabras por sentimiento y tópico
+        self.results_ta  = self.results["ta"]  #Asignaciones de tópicos a documentos a lo largo de las iteraciones.
+
+
+    def metadata(self):
+        # Metadatos que acompañan a los resultados guardados
+        return {"nT": self.nT, "seed": self.seed, "engine": self.engine,
+                "vocabulary_hash": self.vocabulary_hash, **self.params}
 
 
 
@@ -144,10 +187,9 @@ class sentiment_stLDA:
 ############################################################################################
 # Guardar resultados
 if __name__ == "__main__":
-    # Cargar los archivos CSV
-    matrix_words = pd.read_csv(" .csv").values
-    rate = pd.read_csv(" .csv")['x'].values
-    user = pd.read_csv(".csv")['user2'].values
+    # Cargar el corpus generado por Elementos_LDA.py: matriz CSR, puntuaciones, usuarios y vocabulario.
+    # Los arrays se abren mapeados en memoria, sin leerlos ni copiarlos
+    matrix_words, rate, user, vocabulary = load_corpus("corpus", mmap=True)
 
     # Definir los parámetros (Cambiar los parámetros a los deseados)
     nT = 4
@@ -158,26 +200,16 @@ if __name__ == "__main__":
     nupdate = max(1, math.floor(niter / 10))
     nthin = 5
     nburnin = 1500
+    engine = "numba"  # se usa "numpy" si numba no está instalado
 
     # Inicializar y ejecutar el modelo
-    model = sentiment_stLDA(nT=nT, rate=rate, user=user, matrix_words=matrix_words, seed=seed)
+    model = sentiment_stLDA(nT=nT, rate=rate, user=user, matrix_words=matrix_words, seed=seed,
+                            engine=engine, vocabulary=vocabulary)
     model.collapse_gibbs_sampler(niter=niter, nburnin=nburnin, nthin=nthin, 
         nupdate=nupdate, alpha= alpha, eta=eta)
 
-    # Guardar resultados
-    results_ust = model.results_ust
-    results_stw = model.results_stw
-    results_ta = model.results_ta
-
-    # Guardar resultados como archivos
-    import json
-
-    with open(" .json", "w") as f:
-         json.dump({
-              "ust": results_ust.tolist(),
-              "stw": results_stw.tolist(),
-              "ta": results_ta.tolist()
-         }, f)
+    # Guardar resultados (con extensión .json se exporta en el formato heredado)
+    save_results(" .npz", model.results, model.metadata())
 
-    print("Resultados guardados exitosamente en formato CSV.")
+    print("Resultados guardados exitosamente.")
 
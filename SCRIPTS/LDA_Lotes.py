@@ -1,17 +1,29 @@
 """
 Implementación de un modelo de caracterización de tópicos LDA por lotes,
  usando Gibbs Sampling.
+
+Cada nupdate iteraciones se registran los diagnósticos de convergencia
+(Diagnosticos_LDA.py) en diagnosticos.csv, dentro de la carpeta de puntos de
+control.
 """
 
+import os
 import numpy as np
-import pandas as pd
-import json
 import datetime
 from scipy.special import loggamma
 import math
+from Corpus_LDA import to_csr, doc_words, load_corpus
+from Nucleo_Gibbs import resolve_engine, run_sweep, compute_counts
+from Paralelo_LDA import ParallelGibbs
+from Resultados_LDA import (save_results, vocabulary_hash, make_store, normalize_counts,
+                            read_manifest, write_manifest, load_results, CUMULATIVE_POLICIES)
+from Diagnosticos_LDA import ConvergenceMonitor, burn_in_end
+
+DIAGNOSTICS_FILE = "diagnosticos.csv"
 
 class SentimentSTLDA:
-    def __init__(self, nT, rate, user, matrix_words, seed=123):
+    def __init__(self, nT, rate, user, matrix_words, seed=123, nW=None, engine="numpy",
+                 vocabulary=None, results_format="npz"):
         '''
         Inicializa el modelo LDA
 
@@ -20,18 +32,33 @@ class SentimentSTLDA:
         nT : Número de tópicos.
         rate : Puntuaciones de cada reseña.
         user : Usuarios.
-        matrix_words : Matriz de palabras.
+        matrix_words : Matriz de palabras (densa, dispersa de scipy o lista de
+            índices de palabras por documento).
+        nW : Tamaño del vocabulario si matrix_words es una lista de índices.
+        engine : Motor de muestreo, "numpy" o "numba" (compilado). Si numba no
+            está instalado se usa NumPy.
+        vocabulary : Lista de palabras (columnas de matrix_words), se guarda su
+            hash en los metadatos de los resultados.
+        results_format : Formato de los archivos de resultados: "npz", "h5" o
+            "json" (formato heredado).
         '''
         self.nT = nT
         self.rate = rate
         self.users = user
-        self.dw = matrix_words
         self.seed = seed
+        self.engine = resolve_engine(engine)
+        self.vocabulary_hash = vocabulary_hash(vocabulary) if vocabulary is not None else None
+        self.results_format = results_format
+        self.params = {}
 
         # Validar que los datos se pasen correctamente
         if rate is None or user is None or matrix_words is None:
             raise ValueError("Se requieren rate, user y matrix_words para inicializar el modelo.")
 
+        # Matriz documento-palabra en formato disperso (CSR)
+        self.dw = to_csr(matrix_words, nW)
+        self.nwd = np.asarray(self.dw.sum(axis=1)).ravel()  # Número de palabras por documento
+
         # Mapear sentimientos directamente sin categorizarlos
         unique_sentiments = np.unique(rate)
         sentiment_mapping = {val: idx for idx, val in enumerate(unique_sentiments)}
@@ -55,16 +82,7 @@ class SentimentSTLDA:
         np.random.seed(self.seed)
         ta = np.random.choice(np.arange(self.nT), replace=True, size=self.nD)
 
-        ust = np.zeros([self.nU, self.nS, self.nT])
-        for u in range(self.nU):
-            for s in range(self.nS):
-                for t in range(self.nT):
-                    ust[u, s, t] = np.sum((self.users == u) & (self.sa_true == s) & (ta == t))
-
-        stw = np.zeros([self.nS, self.nT, self.nW])
-        for s in range(self.nS):
-            for t in range(self.nT):
-                stw[s, t, :] = np.sum(self.dw[(self.sa_true == s) & (ta == t)], axis=0)
+        ust, stw = compute_counts(self.dw, self.users, self.sa_true, ta, self.nU, self.nS, self.nT)
 
         return ta, ust, stw
     
@@ -77,20 +95,11 @@ class SentimentSTLDA:
         ta : Asignación actualizada de tópicos a documentos.
         '''
         
-        ust = np.zeros([self.nU, self.nS, self.nT])
-        for u in range(self.nU):
-            for s in range(self.nS):
-                for t in range(self.nT):
-                    ust[u, s, t] = np.sum((self.users == u) & (self.sa_true == s) & (ta == t))
-
-        stw = np.zeros([self.nS, self.nT, self.nW])
-        for s in range(self.nS):
-            for t in range(self.nT):
-                stw[s, t, :] = np.sum(self.dw[(self.sa_true == s) & (ta == t)], axis=0)
+        ust, stw = compute_counts(self.dw, self.users, self.sa_true, ta, self.nU, self.nS, self.nT)
 
         return ust, stw
 
-    def gibbs_iteration(self, ta, ust, stw, alpha, eta):
+    def gibbs_iteration(self, ta, ust, stw, alpha, eta, docs=None):
         '''
         Ejecución de una iteración de Gibbs
 
@@ -101,23 +110,34 @@ class SentimentSTLDA:
         stw : Matriz de conteo sentimiento-tópico-palabra.
         alpha : Hiperparámetro para la distribución Dirichlet.
         eta : Hiperparámetro para la distribución Dirichlet.
+        docs : Índices de los documentos a recorrer (por defecto, todos).
         '''
-        for d in range(self.nD):
+        if self.engine == "numba":
+            return run_sweep(self.dw, self.nwd, self.users, self.sa_true, ta, ust, stw, alpha, eta, docs)
+
+        # Totales por fila (s, t) de stw, se actualizan al mover cada documento
+        stw_tot = np.sum(stw, axis=2)
+
+        for d in (range(self.nD) if docs is None else docs):
             # Obtener estado actual del documento d
             u = self.users[d]
             s = self.sa_true[d]
             t = ta[d]
+            cols, cnts = doc_words(self.dw, d)
 
             # Eliminar los conteos
             ust[u, s, t] -= 1
-            stw[s, t] -= self.dw[d,]
+            stw[s, t, cols] -= cnts
+            stw_tot[s, t] -= self.nwd[d]
 
             # Calcular probabilidades
             us_to_t = np.log((alpha + ust[u, s]) / (self.nT * alpha + np.sum(ust[u, s])))
-            w_to_t = loggamma(np.sum(stw[s,] + eta, axis=1))
-            w_to_t -= np.sum(loggamma(stw[s,] + eta), axis=1)
-            w_to_t += np.sum(loggamma(stw[s,] + eta + self.dw[d,]), axis=1)
-            w_to_t -= loggamma(np.sum(stw[s,] + eta, axis=1) + np.sum(self.dw[d]))
+            # Las columnas en las que el documento no aparece se cancelan,
+            # por lo que solo se evalúan las columnas no nulas
+            tot_eta = stw_tot[s] + self.nW * eta
+            stw_eta = stw[s][:, cols] + eta
+            w_to_t = loggamma(tot_eta) - loggamma(tot_eta + self.nwd[d])
+            w_to_t += np.sum(loggamma(stw_eta + cnts) - loggamma(stw_eta), axis=1)
 
             probs = np.exp((us_to_t + w_to_t) - np.max(us_to_t + w_to_t))
             probs /= np.sum(probs)
@@ -127,12 +147,16 @@ class SentimentSTLDA:
             # Agregar de nuevo a los conteos
             ta[d] = t_new
             ust[u, s, t_new] += 1
-            stw[s, t_new] += self.dw[d,]
+            stw[s, t_new, cols] += cnts
+            stw_tot[s, t_new] += self.nwd[d]
 
         return ta, ust, stw
 
     def run_gibbs_sampler(self, niter, nburn, nthin, nlot, alpha, eta,nupdate,
-                          use_previous = False, previous_inference = None, lastlot = None):
+                          use_previous = False, previous_inference = None, lastlot = None,
+                          nworkers = 1, nsync = 1, storage = "all", storage_size = None,
+                          storage_dir = None, checkpoint_dir = "LDA_lotes", early_stop = False,
+                          stop_tol = 1e-3, stop_prop_tol = 0.01, stop_patience = 3):
         '''
         Ejecución del muestreo de Gibb por lotes
 
@@ -144,8 +168,54 @@ class SentimentSTLDA:
         nlot : Tamaño de cada lote de iteraciones.
         alpha : Parámetro Dirichlet para tópicos.
         eta : Parámetro Dirichlet para palabras.
+        nworkers : Número de procesos. Con más de uno, los documentos se reparten
+            por usuario y se muestrean en paralelo (AD-LDA).
+        nsync : Iteraciones entre reconciliaciones de stw en el modo paralelo.
+        storage : Política de almacenamiento de las muestras: "all" (todas en
+            memoria), "mean" (media y varianza), "reservoir" (reserva de
+            storage_size muestras) o "memmap" (todas en disco, en storage_dir).
+        storage_size : Tamaño de la reserva con storage = "reservoir".
+        storage_dir : Carpeta de los archivos con storage = "memmap".
+        checkpoint_dir : Carpeta de los puntos de control por lote y su manifiesto.
+            Con use_previous = True y sin previous_inference, se continúa desde
+            el último lote del manifiesto (ver resume).
+        early_stop : Terminar el calentamiento (lote 0) en cuanto los
+            diagnósticos de convergencia se estabilizan. El calentamiento
+            efectivo se guarda como nburn en los metadatos.
+        stop_tol : Cambio relativo máximo de la log-verosimilitud entre registros.
+        stop_prop_tol : Cambio máximo de las proporciones por sentimiento y de
+            la fracción de documentos que cambian de tópico.
+        stop_patience : Número de registros seguidos que deben ser estables.
         '''
-        if use_previous and previous_inference is not None:
+        nsaved = np.floor(niter / nthin).astype(int) - 1
+        self.params = {"niter": niter, "nburn": nburn, "nthin": nthin, "nlot": nlot,
+                       "alpha": alpha, "eta": eta, "nupdate": nupdate, "nworkers": nworkers,
+                       "nsync": nsync, "storage": storage, "storage_size": storage_size,
+                       "storage_dir": storage_dir, "nsaved": int(nsaved), "early_stop": early_stop,
+                       "stop_tol": stop_tol, "stop_prop_tol": stop_prop_tol, "stop_patience": stop_patience}
+        self.checkpoint_dir = checkpoint_dir
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.manifest = {"metadata": self.metadata(), "lots": []}
+        self.iteration = -1
+        first_lot = 0
+
+        resuming = use_previous and previous_inference is None
+        if resuming and not read_manifest(checkpoint_dir)["lots"]:
+            # Interrumpida antes de completar el calentamiento (lote 0): se empieza de nuevo
+            print("No hay lotes completados en el punto de control, se empieza de nuevo")
+            resuming = use_previous = False
+
+        if resuming:
+            # Continuar desde el último lote completado según el manifiesto
+            self.manifest = read_manifest(checkpoint_dir)
+            last_entry = self.manifest["lots"][-1]
+            print("Inicializando a partir del lote", last_entry["lot"])
+            state, _ = load_results(os.path.join(checkpoint_dir, last_entry["file"]))
+            ta = state["state_ta"].astype(np.int64)
+            ust, stw = self.recompute_counts(ta)  # Los conteos se reconstruyen de forma exacta
+            self.iteration = last_entry["iteration"]
+            first_lot = last_entry["lot"] + 1
+        elif use_previous and previous_inference is not None:
             if lastlot is None:
                 lastlot = 2 #Se pondría el último lote ejecutado 
             index = int(nlot // nthin * lastlot)
@@ -156,20 +226,44 @@ class SentimentSTLDA:
             print("Inicializando aleatoriamente")
             ta, ust, stw = self.init_gibbs_sampler()
 
-        nsaved = np.floor(niter / nthin).astype(int) - 1
-        results_ust = np.zeros([self.nU, self.nS, self.nT, nsaved])
-        results_stw = np.zeros([self.nS, self.nT, self.nW, nsaved])
-        results_ta = np.zeros([self.nD, nsaved])
-
+        if not resuming:
+            # El manifiesto se escribe al empezar, para poder reanudar aunque no se complete ningún lote
+            write_manifest(checkpoint_dir, self.manifest)
+
+        parallel = None
+        if nworkers > 1:
+            print(f"Muestreo en paralelo con {nworkers} procesos")
+            parallel = ParallelGibbs(self, nworkers, nsync)
+            ta, ust, stw = parallel.share(ta, ust, stw)
+
+        shapes = {"ust": (self.nU, self.nS, self.nT), "stw": (self.nS, self.nT, self.nW), "ta": (self.nD,)}
+        samples = make_store(storage, shapes, nsaved, nT=self.nT, size=storage_size,
+                             directory=storage_dir, seed=self.seed)
+
+        if resuming:
+            # Recuperar las muestras (o el estado acumulado). El generador aleatorio
+            # no se restaura: cada lote parte de la semilla seed + lot
+            entries = [entry for entry in self.manifest["lots"] if entry["first_sample"] is not None]
+            if storage in CUMULATIVE_POLICIES:
+                entries = entries[-1:]
+            for entry in entries:
+                lot_data, _ = load_results(os.path.join(checkpoint_dir, entry["file"]))
+                samples.restore(lot_data, entry)
+
+        monitor = ConvergenceMonitor(self.sa_true, self.nS, self.nT,
+                                     os.path.join(checkpoint_dir, DIAGNOSTICS_FILE), append=resuming,
+                                     stop_tol=stop_tol, stop_prop_tol=stop_prop_tol, stop_patience=stop_patience)
         iter_start = datetime.datetime.now()
         
-        last_complete_lot = -1
+        last_complete_lot = first_lot - 1
         total_lots = (niter // nlot) + 1
         
-        #En caso de un error, for lot in range(lastlot + 1, total_lots):
-        for lot in range(total_lots):
+        for lot in range(first_lot, total_lots):
             try: 
+              # Cada lote parte de la semilla seed + lot, por lo que reanudar en
+              # un lote da la misma secuencia que una ejecución sin interrupciones
               np.random.seed(self.seed + lot)
+              lot_first, lot_last = None, None  # Rango de muestras generadas en el lote
               if lot < 1:
                   niterstar = 0
                   niternd = nburn 
@@ -178,87 +272,163 @@ class SentimentSTLDA:
                   niternd = nburn + lot * nlot 
             
               for iter in range(niterstar , niternd + 1):
-                  ta, ust, stw = self.gibbs_iteration(ta, ust, stw, alpha, eta)
-
-                  if (lot > 0) & (iter > nburn) & (iter % nthin == 0):
-                      idx = ((iter - nburn) // nthin) - 1
-                      for s in range(self.nS):
-                          results_ust[:, s, :, idx] = np.apply_along_axis(lambda x: x / np.sum(x), arr=ust[:, s, :], axis=1)
-                          results_stw[s, :, :, idx] = np.apply_along_axis(lambda x: x / np.sum(x), arr=stw[s], axis=1)
-
-                      results_ta[:, idx] = ta
+                  if parallel is None:
+                      ta, ust, stw = self.gibbs_iteration(ta, ust, stw, alpha, eta)
+                  else:
+                      ta, ust, stw = parallel.iteration(ta, ust, stw, alpha, eta)
+
+                  idx = ((iter - nburn) // nthin) - 1
+                  # Solo índices válidos, para que cada lote tenga un rango de muestras propio
+                  if (lot > 0) & (iter > nburn) & (iter % nthin == 0) & (0 <= idx < nsaved):
+                      samples.add(idx, {"ust": normalize_counts(ust), "stw": normalize_counts(stw), "ta": ta})
+                      lot_first = idx if lot_first is None else lot_first
+                      lot_last = idx + 1
 
                   if (iter % nupdate) == 0:
                       print(f'Finalizada iter {iter} a las {datetime.datetime.now()}')
                       print(f'Tiempo por iter: {datetime.datetime.now() - iter_start}')
+                      monitor.update(iter, ta, ust, stw, alpha, eta)
+                      print(f'Diagnósticos: {monitor.summary()}')
+                      if (early_stop and lot == 0 and monitor.converged()
+                              and burn_in_end(iter, nthin) < nburn):
+                          # Los lotes siguientes y la reanudación usan el calentamiento efectivo
+                          nburn = niternd = burn_in_end(iter, nthin)
+                          self.params.update(nburn=nburn, nburn_requested=self.params["nburn"])
+                          self.manifest["metadata"] = self.metadata()
+                          print(f'Diagnósticos estables: el calentamiento termina en la iter {nburn}')
                       iter_start = datetime.datetime.now()
+
+                  if iter >= niternd:
+                      break
                       
-              self.results_ust = results_ust  # Distribución de sentimientos por usuario y tópico
-              self.results_stw = results_stw  # Distribución de palabras por sentimiento y tópico
-              self.results_ta = results_ta    # Asignaciones de tópicos a documentos a lo largo de las iteraciones.
-              self.save_partial_results(lot)  # Llamar a la función para guardar el lote
+              if parallel is not None:
+                  parallel.sync()  # Fin de lote: stw reconciliada, como al reanudar
+              self.results = samples.results()
+              self.results_ust = self.results["ust"]  # Distribución de sentimientos por usuario y tópico
+              self.results_stw = self.results["stw"]  # Distribución de palabras por sentimiento y tópico
+              self.results_ta = self.results["ta"]    # Asignaciones de tópicos a documentos a lo largo de las iteraciones.
+              self.save_partial_results(lot, samples, lot_first, lot_last, ta, niternd)  # Guardar el lote
+              self.iteration = niternd
             
               last_complete_lot = lot
               #inference_result = { "ust": results_ust, "stw": results_stw,"ta": results_ta}
               print( f"Finalizado lot {lot} a las {datetime.datetime.now()}")
             
             except Exception as e:
+              # No se salta el lote: se detiene la ejecución, que puede
+              # continuarse con resume desde el último lote completado
               print(f"Error en el lote {lot} : {e}")
-              lot = last_complete_lot + 1
-              np.random.seed(self.seed + lot)
-              print(f"Retomar el lote {lot}" )
-    def save_partial_results(self, lot):
+              print(f"Último lote completado: {last_complete_lot}. Usar resume('{checkpoint_dir}') para continuar.")
+              if parallel is not None:
+                  ta, ust, stw = parallel.close()
+              monitor.close()
+              raise
+
+        if parallel is not None:
+            ta, ust, stw = parallel.close()
+        monitor.close()
+        self.diagnostics = monitor.history
+
+    def resume(self, checkpoint_dir="LDA_lotes"):
         '''
-        Guardado de los resultados en un archivo JSON después de cada lote.
+        Continúa una ejecución interrumpida desde el último lote completado de
+        la carpeta de puntos de control, con los mismos parámetros. Se
+        recuperan ta, ust, stw, la iteración y las muestras guardadas; como
+        cada lote parte de la semilla seed + lot, el resultado es idéntico al
+        de una ejecución sin interrupciones. Si la ejecución se interrumpió
+        antes de completar el lote 0 (calentamiento), se empieza de nuevo con
+        los parámetros del manifiesto.
+
+        Parameters
+        ----------
+        checkpoint_dir : Carpeta de los puntos de control y su manifiesto.
+        '''
+        params = read_manifest(checkpoint_dir)["metadata"]
+        if params["seed"] != self.seed or params["nT"] != self.nT:
+            raise ValueError("La semilla o el número de tópicos no coinciden con los del punto de control.")
+        if self.vocabulary_hash is not None and params["vocabulary_hash"] not in (None, self.vocabulary_hash):
+            raise ValueError("El vocabulario no coincide con el del punto de control.")
+
+        self.run_gibbs_sampler(params["niter"], params["nburn"], params["nthin"], params["nlot"],
+                               params["alpha"], params["eta"], params["nupdate"], use_previous=True,
+                               nworkers=params["nworkers"], nsync=params["nsync"],
+                               storage=params["storage"], storage_size=params["storage_size"],
+                               storage_dir=params["storage_dir"], checkpoint_dir=checkpoint_dir,
+                               early_stop=params.get("early_stop", False), stop_tol=params.get("stop_tol", 1e-3),
+                               stop_prop_tol=params.get("stop_prop_tol", 0.01),
+                               stop_patience=params.get("stop_patience", 3))
+
+    def metadata(self, lot=None):
+        '''
+        Metadatos que acompañan a los resultados guardados.
+
+        Parameters
+        ----------
+        lot : Último lote completado, si procede.
+        '''
+        metadata = {"nT": self.nT, "seed": self.seed, "engine": self.engine,
+                    "vocabulary_hash": self.vocabulary_hash, **self.params}
+        if lot is not None:
+            metadata["last_complete_lot"] = lot
+        return metadata
+
+    def save_partial_results(self, lot, samples, first, last, ta, iteration):
+        '''
+        Guardado del punto de control de un lote: solo las muestras generadas
+        en el lote (o el estado acumulado con las políticas "mean" y
+        "reservoir") y el estado del muestreador (ta). El generador aleatorio
+        no se guarda, ya que cada lote parte de la semilla seed + lot.
+        El lote se añade al manifiesto.
 
         Parameters
         ----------
         lot : Número de lote completado..
+        samples : Almacén de muestras.
+        first : Índice de la primera muestra del lote (None si no hay muestras).
+        last : Índice siguiente a la última muestra del lote.
+        ta : Asignación actual de tópicos.
+        iteration : Última iteración completada.
         '''
+        results_data = samples.lot_samples(first, last) if first is not None else {}
+        results_data["state_ta"] = np.asarray(ta)
 
-        results_data = {
-               "ust": self.results_ust.tolist(),
-               "stw": self.results_stw.tolist(),
-               "ta": self.results_ta.tolist(),
-               "last_complete_lot": lot
-               }
+        filename = f"LDA_lote_{lot}.{self.results_format}"
+        metadata = {**self.metadata(lot), "iteration": iteration,
+                    "first_sample": first, "last_sample": last}
+        save_results(os.path.join(self.checkpoint_dir, filename), results_data, metadata)
 
-        with open(f"LDA_lote_{lot}.json", "w") as f:
-              json.dump(results_data, f)
+        self.manifest["lots"].append({"lot": lot, "file": filename, "iteration": iteration,
+                                      "first_sample": first, "last_sample": last})
+        write_manifest(self.checkpoint_dir, self.manifest)
 
         print(f"Resultados del lote {lot} guardados exitosamente.")
             
 
 
 if __name__ == "__main__":
-    matrix_words = pd.read_csv(" .csv").values
-    rate = pd.read_csv(" .csv")["review_nueva.rate"].values
-    user = pd.read_csv(" .csv")["user2"].values
+    # Corpus generado por Elementos_LDA.py: matriz CSR, puntuaciones, usuarios y vocabulario.
+    # Los arrays se abren mapeados en memoria, sin leerlos ni copiarlos
+    matrix_words, rate, user, vocabulary = load_corpus("corpus", mmap=True)
 
     #Iniciar de los parámetros
     nT, niter, nburn, nthin, nlot = 10, 150, 10, 1, 50
     alpha, eta, seed = 1, 1, 123
     nupdate = max(1, math.floor(niter / 10))
+    engine = "numba"  # Se usa "numpy" si numba no está instalado
+    nworkers, nsync = 1, 1  # Procesos en paralelo e iteraciones entre reconciliaciones
+    storage = "all"  # "mean" si solo se necesita la media a posteriori
+    early_stop = False  # Terminar el calentamiento cuando los diagnósticos se estabilizan
 
-    model = SentimentSTLDA(nT, rate, user, matrix_words, seed)
+    model = SentimentSTLDA(nT, rate, user, matrix_words, seed, engine=engine, vocabulary=vocabulary)
     
-    #Si se tiene un resultado previo:
-    #previous_inference = {}
-    #model.run_gibbs_sampler(niter, nburn, nthin, nlot, alpha, eta, nupdate,
-    #                          use_previous = True, previous_inference = previous_inference, lastlot = [valor])
+    #Para continuar desde el último lote guardado en la carpeta de puntos de control:
+    #model.resume("LDA_lotes")
     
-    model.run_gibbs_sampler(niter, nburn, nthin, nlot, alpha, eta, nupdate)
+    model.run_gibbs_sampler(niter, nburn, nthin, nlot, alpha, eta, nupdate,
+                            nworkers = nworkers, nsync = nsync, storage = storage, early_stop = early_stop)
     
-    # Guardar resultados
-    results_ust = model.results_ust
-    results_stw = model.results_stw
-    results_ta = model.results_ta
-
-    with open("LDA.json", "w") as f:
-         json.dump({
-              "ust": results_ust.tolist(),
-              "stw": results_stw.tolist(),
-              "ta": results_ta.tolist()
-         }, f)
-
-    print("Resultados guardados exitosamente en formato json.")
+    # Guardar resultados (usar "LDA.json" para exportar en el formato JSON heredado).
+    # Si la ejecución se ha reanudado, los lotes completos se unen con Unir_Lotes_LDA.py
+    save_results("LDA.npz", model.results, model.metadata())
+
+    print("Resultados guardados exitosamente en LDA.npz.")
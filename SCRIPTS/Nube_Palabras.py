@@ -2,53 +2,143 @@
 Generación de nubes de palabras para cada combinación de sentimiento y tópico
 basadas en las distribuciones de palabras obtenidas de un modelo LDA entrenado 
 con reseñas.
+
+Las palabras más probables de todas las combinaciones se seleccionan a la vez
+con argpartition y las nubes se generan en paralelo en varios procesos,
+guardando el PNG directamente con WordCloud.to_file. Se guarda un hash de las
+frecuencias de cada nube (en _hashes.json) y en las siguientes ejecuciones
+solo se generan las nubes cuyas frecuencias han cambiado.
 """
 from wordcloud import WordCloud
-import matplotlib.pyplot as plt
-import os
+from multiprocessing import Pool
+import hashlib
 import json
-import pandas as pd
+import os
 import numpy as np
+from Resultados_LDA import ResultsReader, check_vocabulary
+from Corpus_LDA import load_vocabulary
+
+# Parámetros de las nubes
+WORDCLOUD_PARAMS = dict(width=800, height=400, background_color='white', colormap='viridis', max_words=500)
+
+HASHES_FILE = "_hashes.json"
+
+
+def top_words(distributions, k=1000):
+    '''
+    Índices y frecuencias de las k palabras más probables de cada combinación
+    (sentimiento, tópico), de mayor a menor, con un único argpartition.
+
+    Parameters
+    ----------
+    distributions : Distribuciones de palabras (nS x nT x nW).
+    k : Número de palabras por combinación.
+    '''
+    nW = distributions.shape[-1]
+    k = min(k, nW)
+    if k < nW:
+        top = np.argpartition(distributions, nW - k, axis=-1)[..., nW - k:]
+    else:
+        top = np.broadcast_to(np.arange(nW), distributions.shape).copy()
+    values = np.take_along_axis(distributions, top, axis=-1)
+    order = np.argsort(-values, axis=-1, kind='stable')
+    return np.take_along_axis(top, order, axis=-1), np.take_along_axis(values, order, axis=-1)
+
+
+def cloud_hash(freq_dict):
+    '''
+    Hash de las frecuencias y los parámetros de una nube.
+
+    Parameters
+    ----------
+    freq_dict : Diccionario palabra -> frecuencia.
+    '''
+    content = json.dumps([WORDCLOUD_PARAMS, [[word, float(freq)] for word, freq in freq_dict.items()]])
+    return hashlib.blake2b(content.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def render_cloud(task):
+    '''
+    Genera una nube y la guarda como PNG. Devuelve el nombre del archivo.
+
+    Parameters
+    ----------
+    task : Tupla (archivo de salida, diccionario palabra -> frecuencia).
+    '''
+    filename, freq_dict = task
+    WordCloud(**WORDCLOUD_PARAMS).generate_from_frequencies(freq_dict).to_file(filename)
+    return filename
 
-# Cargar los resultados
-with open(" .json", "r") as f:
-    results = json.load(f)
 
-results_stw = np.array(results['stw'])  # (nS, nT, nW, nIter)
-nS, nT, nW, _ = results_stw.shape
+def generate_clouds(distributions, words, output_dir, k=1000, nprocesses=4, force=False):
+    '''
+    Genera las nubes de palabras de todas las combinaciones (sentimiento,
+    tópico) que han cambiado desde la última ejecución. Devuelve el número de
+    nubes generadas y el de nubes sin cambios.
 
-# Palabras del vocabulario
-matrix_words_df = pd.read_csv(" .csv")
-words = matrix_words_df.columns.tolist()
+    Parameters
+    ----------
+    distributions : Distribuciones de palabras (nS x nT x nW).
+    words : Lista de palabras del vocabulario.
+    output_dir : Carpeta de salida.
+    k : Número máximo de palabras por nube.
+    nprocesses : Número de procesos.
+    force : Generar todas las nubes aunque no hayan cambiado.
+    '''
+    os.makedirs(output_dir, exist_ok=True)
+    hashes_path = os.path.join(output_dir, HASHES_FILE)
+    hashes = {}
+    if os.path.exists(hashes_path) and not force:
+        with open(hashes_path, 'r') as f:
+            hashes = json.load(f)
 
-# Media sobre las iteraciones
-mean_stw_last = np.mean(results_stw, axis=-1)
+    nS, nT, _ = distributions.shape
+    indices, values = top_words(distributions, k)
+    tasks, new_hashes, unchanged = [], {}, 0
+    for s in range(nS):
+        for t in range(nT):
+            freq_dict = {words[i]: v for i, v in zip(indices[s, t], values[s, t]) if v > 0}
+            if not freq_dict:
+                continue  # Evita errores si no hay palabras
 
-# Directorio de salida
-output_dir = "Nubes_de_palabras"
-os.makedirs(output_dir, exist_ok=True)
+            filename = os.path.join(output_dir, f"Nube_sentimiento{s}_topico{t}.png")
+            digest = cloud_hash(freq_dict)
+            if hashes.get(os.path.basename(filename)) == digest and os.path.exists(filename):
+                unchanged += 1
+                continue
+            new_hashes[os.path.basename(filename)] = digest
+            tasks.append((filename, freq_dict))
 
-# Generar las nubes
-for s in range(nS):
-    for t in range(nT):
-        word_frequencies = mean_stw_last[s, t, :]
-        sorted_indices = np.argsort(word_frequencies)[::-1]
+    def record(filenames):
+        # Solo se guarda el hash de las nubes que se han generado
+        for filename in filenames:
+            hashes[os.path.basename(filename)] = new_hashes[os.path.basename(filename)]
+            print(f" Nube generada: {os.path.basename(filename)}")
 
-        freq_dict = {words[i]: word_frequencies[i] for i in sorted_indices[:1000] if word_frequencies[i] > 0}
+    try:
+        if nprocesses > 1 and len(tasks) > 1:
+            with Pool(min(nprocesses, len(tasks))) as pool:
+                record(pool.imap_unordered(render_cloud, tasks))
+        else:
+            record(map(render_cloud, tasks))
+    finally:
+        with open(hashes_path, 'w') as f:
+            json.dump(hashes, f, indent=2)
+    return len(tasks), unchanged
 
-        if not freq_dict:
-            continue  # Evita errores si no hay palabras
 
-        wordcloud = WordCloud(width=800, height=400, background_color='white', colormap='viridis', max_words=500).generate_from_frequencies(freq_dict)
+if __name__ == "__main__":
+    # Palabras del vocabulario
+    words = load_vocabulary("corpus")
 
-        plt.figure(figsize=(10, 5))
-        plt.imshow(wordcloud, interpolation='bilinear')
-        plt.axis('off')
-        #plt.title(f'Sentimiento {s} - Tópico {t}')
-        plt.tight_layout()
+    # Media sobre las iteraciones, leyendo stw (nS, nT, nW, nIter) por bloques (NPZ, HDF5 o JSON heredado)
+    with ResultsReader(" .npz") as reader:
+        check_vocabulary(reader.metadata, words)
+        mean_stw_last = reader.mean('stw')
 
-        filename = os.path.join(output_dir, f"Nube_sentimiento{s}_topico{t}.png")
-        plt.savefig(filename)
-        plt.close()
+    # Directorio de salida
+    output_dir = "Nubes_de_palabras"
 
-        print(f" Nube generada: Sentimiento {s}, Tópico {t}")
+    # Generar las nubes
+    generated, unchanged = generate_clouds(mean_stw_last, words, output_dir, k=1000, nprocesses=4)
+    print(f" Nubes generadas: {generated}, sin cambios: {unchanged}")
@@ -0,0 +1,207 @@
+"""
+Núcleo compilado del muestreo de Gibbs colapsado de los modelos LDA.
+
+Si numba está instalado, `sweep_numba` ejecuta una iteración completa sobre
+todos los documentos en código nativo. Si no lo está, los modelos usan su
+versión de NumPy como alternativa.
+"""
+
+import math
+import numpy as np
+from scipy import sparse
+from scipy.special import loggamma
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+ENGINES = ("numpy", "numba")
+
+
+def resolve_engine(engine):
+    '''
+    Comprueba el motor de muestreo solicitado. Si se pide numba y no está
+    instalado, se usa NumPy.
+
+    Parameters
+    ----------
+    engine : "numpy" o "numba".
+    '''
+    if engine not in ENGINES:
+        raise ValueError(f"Motor desconocido: {engine}. Opciones: {ENGINES}")
+    if engine == "numba" and not NUMBA_AVAILABLE:
+        print("numba no está instalado, se usa el motor de NumPy")
+        return "numpy"
+    return engine
+
+
+def _sweep(indptr, indices, data, nwd, users, sa_true, ta, ust, stw, stw_tot,
+           alpha, eta, uniforms, docs):
+    '''
+    Iteración de Gibbs sobre los documentos indicados. Modifica ta, ust, stw y
+    stw_tot en el sitio.
+
+    Parameters
+    ----------
+    indptr, indices, data : Matriz documento-palabra en formato CSR.
+    nwd : Número de palabras por documento.
+    users : Usuario de cada documento.
+    sa_true : Sentimiento de cada documento.
+    ta : Asignación actual de tópicos.
+    ust : Matriz de conteo usuario-sentimiento-tópico.
+    stw : Matriz de conteo sentimiento-tópico-palabra.
+    stw_tot : Totales por fila (s, t) de stw.
+    alpha : Hiperparámetro para la distribución Dirichlet.
+    eta : Hiperparámetro para la distribución Dirichlet.
+    uniforms : Un número aleatorio uniforme por documento de docs.
+    docs : Índices de los documentos a recorrer, en orden.
+    '''
+    nT = ust.shape[2]
+    nW = stw.shape[2]
+    logp = np.empty(nT)
+    cdf = np.empty(nT)
+
+    for i in range(docs.shape[0]):
+        d = docs[i]
+        u = users[d]
+        s = sa_true[d]
+        t = ta[d]
+        start = indptr[d]
+        end = indptr[d + 1]
+
+        # Eliminar los conteos
+        ust[u, s, t] -= 1
+        for j in range(start, end):
+            stw[s, t, indices[j]] -= data[j]
+        stw_tot[s, t] -= nwd[d]
+
+        # Calcular probabilidades (en escala logarítmica)
+        ust_sum = 0.0
+        for k in range(nT):
+            ust_sum += ust[u, s, k]
+        for k in range(nT):
+            us_to_t = math.log((alpha + ust[u, s, k]) / (nT * alpha + ust_sum))
+            tot_eta = stw_tot[s, k] + nW * eta
+            w_to_t = math.lgamma(tot_eta) - math.lgamma(tot_eta + nwd[d])
+            acc = 0.0
+            for j in range(start, end):
+                x = stw[s, k, indices[j]] + eta
+                acc += math.lgamma(x + data[j]) - math.lgamma(x)
+            logp[k] = us_to_t + (w_to_t + acc)
+
+        # Muestrear el nuevo tópico igual que np.random.choice(p=probs)
+        lmax = logp.max()
+        total = 0.0
+        for k in range(nT):
+            logp[k] = math.exp(logp[k] - lmax)
+            total += logp[k]
+        acc = 0.0
+        for k in range(nT):
+            acc += logp[k] / total
+            cdf[k] = acc
+        t_new = nT - 1
+        for k in range(nT):
+            if uniforms[i] < cdf[k] / cdf[nT - 1]:
+                t_new = k
+                break
+
+        # Agregar de nuevo a los conteos
+        ta[d] = t_new
+        ust[u, s, t_new] += 1
+        for j in range(start, end):
+            stw[s, t_new, indices[j]] += data[j]
+        stw_tot[s, t_new] += nwd[d]
+
+
+if NUMBA_AVAILABLE:
+    sweep_numba = njit(cache=True)(_sweep)
+else:
+    sweep_numba = None
+
+
+def compute_counts(dw, users, sa_true, ta, nU, nS, nT):
+    '''
+    Calcula los conteos ust y stw a partir de una asignación de tópicos con
+    una sola pasada sobre los documentos.
+
+    Parameters
+    ----------
+    dw : Matriz documento-palabra en formato CSR.
+    users : Usuario de cada documento (enteros consecutivos desde 0).
+    sa_true : Sentimiento de cada documento.
+    ta : Asignación de tópicos a documentos.
+    nU : Número de usuarios.
+    nS : Número de sentimientos.
+    nT : Número de tópicos.
+    '''
+    users = np.asarray(users, dtype=np.int64)
+    sa_true = np.asarray(sa_true, dtype=np.int64)
+    ta = np.asarray(ta, dtype=np.int64)
+
+    # ust: conteo sobre el índice aplanado (u, s, t)
+    ust_idx = (users * nS + sa_true) * nT + ta
+    ust = np.bincount(ust_idx, minlength=nU * nS * nT).astype(np.float64).reshape(nU, nS, nT)
+
+    # stw: matriz indicadora (s, t) x documento multiplicada por la matriz documento-palabra
+    nD = dw.shape[0]
+    group = sparse.csr_matrix((np.ones(nD), (sa_true * nT + ta, np.arange(nD))), shape=(nS * nT, nD))
+    stw = (group @ dw).toarray().reshape(nS, nT, dw.shape[1])
+
+    return ust, stw
+
+
+def run_sweep(dw, nwd, users, sa_true, ta, ust, stw, alpha, eta, docs=None):
+    '''
+    Ejecuta una iteración completa con el núcleo compilado. Consume un número
+    aleatorio por documento del generador global de NumPy, igual que la
+    versión de referencia con np.random.choice.
+
+    Parameters
+    ----------
+    dw : Matriz documento-palabra en formato CSR.
+    nwd : Número de palabras por documento.
+    users : Usuario de cada documento.
+    sa_true : Sentimiento de cada documento.
+    ta : Asignación actual de tópicos.
+    ust : Matriz de conteo usuario-sentimiento-tópico.
+    stw : Matriz de conteo sentimiento-tópico-palabra.
+    alpha : Hiperparámetro para la distribución Dirichlet.
+    eta : Hiperparámetro para la distribución Dirichlet.
+    docs : Índices de los documentos a recorrer (por defecto, todos).
+    '''
+    docs = np.arange(len(ta)) if docs is None else np.asarray(docs, dtype=np.int64)
+    ta = np.ascontiguousarray(ta, dtype=np.int64)
+    users = np.ascontiguousarray(users, dtype=np.int64)
+    sa_true = np.ascontiguousarray(sa_true, dtype=np.int64)
+    stw_tot = np.sum(stw, axis=2)
+    uniforms = np.random.random_sample(len(docs))
+    sweep_numba(dw.indptr, dw.indices, dw.data, nwd, users, sa_true, ta, ust, stw,
+                stw_tot, float(alpha), float(eta), uniforms, docs)
+    return ta, ust, stw
+
+
+def joint_log_likelihood(ust, stw, alpha, eta):
+    '''
+    Log-verosimilitud conjunta colapsada log p(w, z) del modelo, útil para
+    comparar el estado de distintas ejecuciones.
+
+    Parameters
+    ----------
+    ust : Matriz de conteo usuario-sentimiento-tópico.
+    stw : Matriz de conteo sentimiento-tópico-palabra.
+    alpha : Hiperparámetro para la distribución Dirichlet.
+    eta : Hiperparámetro para la distribución Dirichlet.
+    '''
+    nT = ust.shape[2]
+    nW = stw.shape[2]
+
+    # Término de palabras, p(w | z)
+    ll = stw.shape[0] * nT * (loggamma(nW * eta) - nW * loggamma(eta))
+    ll += np.sum(loggamma(stw + eta)) - np.sum(loggamma(np.sum(stw, axis=2) + nW * eta))
+
+    # Término de tópicos, p(z | u, s)
+    ll += ust.shape[0] * ust.shape[1] * (loggamma(nT * alpha) - nT * loggamma(alpha))
+    ll += np.sum(loggamma(ust + alpha)) - np.sum(loggamma(np.sum(ust, axis=2) + nT * alpha))
+    return float(ll)
@@ -0,0 +1,185 @@
+"""
+Muestreo de Gibbs en paralelo (LDA distribuido aproximado, AD-LDA) para el
+modelo LDA por lotes.
+
+Los documentos se reparten por usuario entre varios procesos: como ust es
+por usuario, dos fragmentos nunca modifican la misma fila de ust. Cada
+fragmento muestrea sobre su propia copia de stw y las diferencias se
+reconcilian en la matriz global cada `nsync` iteraciones y al final de cada
+lote. ta, ust, stw y las copias locales se guardan en memoria compartida.
+"""
+
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+# Estado de cada proceso trabajador
+_worker = {}
+
+
+def split_users(users, nshards):
+    '''
+    Reparte los usuarios en fragmentos con un número de documentos similar y
+    devuelve los índices de los documentos de cada fragmento.
+
+    Parameters
+    ----------
+    users : Usuario de cada documento.
+    nshards : Número de fragmentos.
+    '''
+    counts = np.bincount(users)
+    load = np.zeros(nshards)
+    owner = np.empty(len(counts), dtype=np.int64)
+
+    # Asignación voraz: el usuario con más documentos va al fragmento con menos carga
+    for u in np.argsort(counts)[::-1]:
+        k = np.argmin(load)
+        owner[u] = k
+        load[k] += counts[u]
+
+    shard_of_doc = owner[users]
+    shards = [np.flatnonzero(shard_of_doc == k) for k in range(nshards)]
+    return [docs for docs in shards if len(docs) > 0]
+
+
+def _attach(spec):
+    '''Abre un array en memoria compartida a partir de (nombre, forma, dtype).'''
+    name, shape, dtype = spec
+    shm = SharedMemory(name=name)
+    _worker.setdefault("shm", []).append(shm)
+    return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+
+def _init_worker(model, shards, specs):
+    '''Inicializa un proceso trabajador con el modelo y los arrays compartidos.'''
+    _worker["model"] = model
+    _worker["shards"] = shards
+    for key, spec in specs.items():
+        _worker[key] = _attach(spec)
+
+
+def _sample_shard(k, refresh, seed, alpha, eta):
+    '''
+    Ejecuta una iteración de Gibbs sobre los documentos del fragmento k.
+
+    Parameters
+    ----------
+    k : Índice del fragmento.
+    refresh : Si es True, la copia local de stw se actualiza con la global.
+    seed : Semilla de esta iteración y fragmento.
+    alpha : Hiperparámetro para la distribución Dirichlet.
+    eta : Hiperparámetro para la distribución Dirichlet.
+    '''
+    local = _worker["local"][k]
+    if refresh:
+        local[:] = _worker["stw"]
+
+    np.random.seed(seed)
+    _worker["model"].gibbs_iteration(_worker["ta"], _worker["ust"], local, alpha, eta,
+                                     docs=_worker["shards"][k])
+
+
+class ParallelGibbs:
+    def __init__(self, model, nworkers, nsync=1):
+        '''
+        Prepara el muestreo en paralelo por fragmentos de usuarios.
+
+        Parameters
+        ----------
+        model : Modelo SentimentSTLDA.
+        nworkers : Número de procesos.
+        nsync : Número de iteraciones entre reconciliaciones de stw.
+        '''
+        self.model = model
+        self.nworkers = nworkers
+        self.nsync = max(1, nsync)
+        self.shards = split_users(np.asarray(model.users), nworkers)
+        self.nsweeps = 0
+        self.shm = []
+        self.executor = None
+
+    def _shared_array(self, shape, dtype):
+        size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        shm = SharedMemory(create=True, size=size)
+        self.shm.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf), (shm.name, shape, dtype)
+
+    def share(self, ta, ust, stw):
+        '''
+        Copia el estado inicial a memoria compartida, arranca los procesos y
+        devuelve ta, ust y stw respaldados por memoria compartida.
+
+        Parameters
+        ----------
+        ta : Asignación inicial de tópicos.
+        ust : Matriz de conteo usuario-sentimiento-tópico.
+        stw : Matriz de conteo sentimiento-tópico-palabra.
+        '''
+        self.ta, ta_spec = self._shared_array(ta.shape, np.int64)
+        self.ust, ust_spec = self._shared_array(ust.shape, np.float64)
+        self.stw, stw_spec = self._shared_array(stw.shape, np.float64)
+        self.local, local_spec = self._shared_array((len(self.shards),) + stw.shape, np.float64)
+        self.ta[:] = ta
+        self.ust[:] = ust
+        self.stw[:] = stw
+
+        specs = {"ta": ta_spec, "ust": ust_spec, "stw": stw_spec, "local": local_spec}
+        self.executor = ProcessPoolExecutor(max_workers=self.nworkers, mp_context=get_context("fork"),
+                                            initializer=_init_worker,
+                                            initargs=(self.model, self.shards, specs))
+        return self.ta, self.ust, self.stw
+
+    def iteration(self, ta, ust, stw, alpha, eta):
+        '''
+        Ejecuta una iteración de Gibbs con todos los fragmentos en paralelo.
+        Entre reconciliaciones, stw refleja el estado de la última
+        reconciliación; ta y ust están siempre al día.
+
+        Parameters
+        ----------
+        ta, ust, stw : Arrays devueltos por share.
+        alpha : Hiperparámetro para la distribución Dirichlet.
+        eta : Hiperparámetro para la distribución Dirichlet.
+        '''
+        refresh = self.nsweeps % self.nsync == 0
+        seeds = np.random.randint(0, 2**31 - 1, size=len(self.shards))
+        futures = [self.executor.submit(_sample_shard, k, refresh, int(seeds[k]), alpha, eta)
+                   for k in range(len(self.shards))]
+        for future in futures:
+            future.result()
+
+        self.nsweeps += 1
+        if self.nsweeps % self.nsync == 0:
+            self.reconcile()
+        return ta, ust, stw
+
+    def reconcile(self):
+        '''Suma a stw global las diferencias acumuladas por cada fragmento.'''
+        self.stw += np.sum(self.local, axis=0) - len(self.shards) * self.stw
+
+    def sync(self):
+        '''
+        Reconcilia stw si hay diferencias pendientes y reinicia el ciclo de
+        nsync iteraciones. Se llama al final de cada lote, de modo que un
+        lote reanudado sigue el mismo calendario de reconciliaciones que una
+        ejecución sin interrupciones.
+        '''
+        if self.nsweeps % self.nsync != 0:
+            self.reconcile()
+        self.nsweeps = 0
+
+    def close(self):
+        '''
+        Reconcilia stw, detiene los procesos, libera la memoria compartida y
+        devuelve copias de ta, ust y stw.
+        '''
+        self.sync()
+        self.executor.shutdown()
+        ta, ust, stw = self.ta.copy(), self.ust.copy(), self.stw.copy()
+        del self.ta, self.ust, self.stw, self.local
+        for shm in self.shm:
+            shm.close()
+            shm.unlink()
+        self.shm = []
+        return ta, ust, stw
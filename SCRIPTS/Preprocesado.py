@@ -8,62 +8,78 @@ y preparando los datos para su posterior análisis.
 
 import pandas as pd
 import re
+import time
+import hashlib
 import gensim 
 import nltk 
 from nltk.corpus import stopwords 
 import spacy
 
-file_path = " "
-data = pd.read_csv(file_path)
+from Tablas_intermedias import iter_table, read_table, table_columns, TableWriter
 
-# Convertir a DataFrame
-data = pd.DataFrame(data)
-#Cambiar el nombre de las columnas
-data.columns=['user_id', 'book_id', 'rate', 'review', 'date_added']
+# Recursos de NLTK y spaCy, se cargan con load_resources
+stop_words = None
+nlp = None
 
-# Eliminar reseñas duplicadas
-data = data.drop_duplicates(subset='review')
-
-# Descargar stopwords de NLTK antes de usarlas
-nltk.download('stopwords')
-stop_words = set(stopwords.words('english'))
+def load_resources():
+    '''
+    Descarga las stopwords de NLTK y carga el modelo de spaCy antes de usarlos.
+    '''
+    global stop_words, nlp
+    if stop_words is None:
+        nltk.download('stopwords')
+        stop_words = set(stopwords.words('english'))
+    if nlp is None:
+        nlp = spacy.load('en_core_web_sm', disable=['parser', 'ner'])
 
-# Cargar el modelo de spaCy antes de la lematización
-nlp = spacy.load('en_core_web_sm', disable=['parser', 'ner'])
+# Patrones de limpieza, compilados una sola vez
+URL_PATTERN = re.compile(r'https?://\S+|www\.\S+')
+REPEAT_PATTERN = re.compile(r'(.)\1{4,}')
+SEPARATOR_PATTERN = re.compile(r'[^A-Za-z0-9_]+')
+# Dígitos y _ a espacio, mayúsculas a minúsculas
+CHAR_TABLE = str.maketrans('0123456789_ABCDEFGHIJKLMNOPQRSTUVWXYZ',
+                           ' ' * 11 + 'abcdefghijklmnopqrstuvwxyz')
 
 # Preprocesar los datos de texto 
 def preprocess_text(text): 
     '''
     Preprocesa el texto eliminando URLs, saltos de línea, tabulaciones, puntuación, caracteres especiales, etc.
 
+    Equivale a la cadena original de sustituciones: eliminar URLs, caracteres
+    repetidos más de 4 veces, puntuación, caracteres no ASCII, espacios
+    adicionales, correos, apóstrofos y caracteres no alfabéticos, y pasar a
+    minúsculas. Tras eliminar la puntuación no quedan ni @ ni apóstrofos, por
+    lo que esos pasos no cambian nada; el resto se reduce a tres pasadas y una
+    tabla de traducción.
+
     Parameters
     ----------
     text : str
         Reseña de texto que será procesada.
     '''
     #Elimina URLs
-    text = re.sub(r'https?://\S+|www\.\S+', '', text)
-    # Eliminar saltos de línea y tabulaciones
-    text = re.sub(r'[\n\r\t]', ' ', text)
+    text = URL_PATTERN.sub('', text)
     #Eliminar carácteres repetidos mas de 4 veces (ej: aaaaaaaaaaaa)
-    text = re.sub(r'(.)\1{4,}', ' ', text)
-    # Eliminar puntuación
-    text = re.sub(r'[^\w\s]', ' ', text)
-    #Eliminar _
-    #text = re.sub(r'_', ' ', text)
-    # Eliminar caracteres no ASCII
-    text = re.sub(r'[^\x00-\x7F]+', ' ', text)
-    # Eliminar espacios adicionales 
-    text = re.sub(r'\s+', ' ', text) 
-    # Eliminar correos electrónicos 
-    text = re.sub(r'\S*@\S*\s?', '', text) 
-    # Eliminar apóstrofos 
-    text = re.sub(r'\'', '', text)
-    # Eliminar caracteres no alfabéticos 
-    text = re.sub(r'[^a-zA-Z]', ' ', text) 
-    # Convertir a minúsculas 
-    text = text.lower() 
-    return text 
+    text = REPEAT_PATTERN.sub(' ', text)
+    # Todo lo que no sea letra, dígito o _ ASCII pasa a un único espacio
+    text = SEPARATOR_PATTERN.sub(' ', text)
+    # Dígitos y _ a espacio y convertir a minúsculas
+    return text.translate(CHAR_TABLE)
+
+def preprocess_series(reviews):
+    '''
+    Aplica preprocess_text a una serie de pandas con los métodos de cadena
+    vectorizados.
+
+    Parameters
+    ----------
+    reviews : pd.Series
+        Reseñas de texto que serán procesadas.
+    '''
+    return (reviews.str.replace(URL_PATTERN, '', regex=True)
+                   .str.replace(REPEAT_PATTERN, ' ', regex=True)
+                   .str.replace(SEPARATOR_PATTERN, ' ', regex=True)
+                   .str.translate(CHAR_TABLE))
 
 # Tokenización y eliminación de stopwords
 def tokenize(text):
@@ -93,25 +109,208 @@ def lemmatize(tokens):
     return [token.lemma_ for token in doc]
 
 
-data['cleaned_text'] = data['review'].apply(preprocess_text)
+def _update_cache(cache, tokens, doc):
+    '''
+    Añade a la caché los lemas de cada token, alineando los tokens de spaCy
+    con los tokens originales por su posición en el texto.
+    '''
+    ends = []
+    pos = 0
+    for token in tokens:
+        pos += len(token)
+        ends.append(pos)
+        pos += 1
+
+    token_lemmas = [[] for _ in tokens]
+    j = 0
+    for token in doc:
+        while j < len(tokens) - 1 and token.idx >= ends[j]:
+            j += 1
+        token_lemmas[j].append(token.lemma_)
+
+    for token, lemmas in zip(tokens, token_lemmas):
+        cache.setdefault(token, lemmas)
+
+
+def lemmatize_batch(token_lists, batch_size=1000, n_process=1, cache=None):
+    '''
+    Lematiza varias reseñas a la vez pasando los textos por nlp.pipe en lotes
+    de batch_size, con n_process procesos. Sin caché, el resultado es el mismo
+    que aplicar lemmatize a cada reseña.
+
+    Parameters
+    ----------
+    token_lists : list
+        Listas de tokens de cada reseña.
+    batch_size : int
+        Número de reseñas por lote de spaCy.
+    n_process : int
+        Número de procesos de spaCy.
+    cache : dict, opcional
+        Caché token -> lemas. Las reseñas cuyos tokens ya están todos en la
+        caché no pasan por spaCy. El lema de un token es el de su primera
+        aparición, por lo que puede diferir del que spaCy daría en otro contexto.
+    '''
+    token_lists = list(token_lists)
+    lemmas = [None] * len(token_lists)
+
+    pending = []
+    for i, tokens in enumerate(token_lists):
+        if cache is not None and all(token in cache for token in tokens):
+            lemmas[i] = [lemma for token in tokens for lemma in cache[token]]
+        else:
+            pending.append(i)
+
+    texts = (" ".join(token_lists[i]) for i in pending)
+    for i, doc in zip(pending, nlp.pipe(texts, batch_size=batch_size, n_process=n_process)):
+        lemmas[i] = [token.lemma_ for token in doc]
+        if cache is not None:
+            _update_cache(cache, token_lists[i], doc)
+
+    return lemmas
+
+
+def review_digest(review):
+    '''
+    Resumen de 16 bytes de una reseña, usado para detectar duplicados sin
+    guardar el texto completo. Las reseñas vacías (NaN) comparten la clave None.
+
+    Parameters
+    ----------
+    review : str
+        Reseña de texto.
+    '''
+    if not isinstance(review, str):
+        return None
+    return hashlib.blake2b(review.encode('utf-8'), digest_size=16).digest()
+
+
+def drop_seen_reviews(data, seen):
+    '''
+    Elimina las reseñas ya vistas, en este bloque o en bloques anteriores,
+    conservando la primera aparición igual que drop_duplicates(subset='review').
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Bloque de reseñas con la columna review.
+    seen : set
+        Resúmenes de las reseñas ya vistas; se actualiza en el sitio.
+    '''
+    keep = []
+    for review in data['review']:
+        digest = review_digest(review)
+        keep.append(digest not in seen)
+        seen.add(digest)
+    return data.loc[keep]
+
+
+def preprocess_chunk(data, batch_size=1000, n_process=1, cache=None):
+    '''
+    Limpia, tokeniza y lematiza un bloque de reseñas y devuelve el bloque con
+    la columna text, sin las reseñas que quedan vacías.
+
+    Parameters
+    ----------
+    data : pd.DataFrame
+        Bloque de reseñas con la columna review.
+    batch_size : int
+        Número de reseñas por lote de spaCy.
+    n_process : int
+        Número de procesos de spaCy.
+    cache : dict, opcional
+        Caché de lemas por token (ver lemmatize_batch).
+    '''
+    tokens = preprocess_series(data['review']).apply(tokenize)
+    lemmas = lemmatize_batch(tokens, batch_size=batch_size, n_process=n_process, cache=cache)
+
+    # Unir de nuevo
+    data = data.assign(text=pd.Series([' '.join(x) for x in lemmas], index=data.index, dtype=object))
+
+    #Eliminar text en blanco
+    return data[data['text'].str.strip() != '']
+
+
+def preprocess_file(file_path, output_path, chunksize=100000, batch_size=1000, n_process=1, use_cache=False):
+    '''
+    Preprocesa el archivo de reseñas por bloques de chunksize filas y añade
+    cada bloque procesado al archivo de salida, de forma que la memoria no
+    depende del tamaño del archivo. Los duplicados se eliminan con un conjunto
+    de resúmenes de las reseñas y la columna id sigue la numeración entre
+    bloques, por lo que la salida es la misma que procesando todo el archivo
+    de una vez.
+
+    La entrada y la salida pueden ser CSV o Parquet según su extensión (ver
+    Tablas_intermedias.py); con Parquet se conservan los tipos de las columnas.
+
+    Parameters
+    ----------
+    file_path : str
+        Archivo de entrada (CSV o Parquet).
+    output_path : str
+        Archivo de salida (CSV o Parquet).
+    chunksize : int
+        Número de filas por bloque. Con None se lee el archivo completo.
+    batch_size : int
+        Número de reseñas por lote de spaCy.
+    n_process : int
+        Número de procesos de spaCy.
+    use_cache : bool
+        Si es True, se usa una caché de lemas por token común a todos los bloques.
+    '''
+    # Descargar stopwords de NLTK y cargar el modelo de spaCy
+    load_resources()
+
+    # La reseña se lee siempre como texto, aunque un bloque solo tenga números
+    review_column = table_columns(file_path)[3]
+    if chunksize is None:
+        chunks = [read_table(file_path, dtype={review_column: str})]
+    else:
+        chunks = iter_table(file_path, batch_size=chunksize, dtype={review_column: str})
+
+    seen = set()
+    cache = {} if use_cache else None
+    next_id = 1
+    nread = 0
+    writer = TableWriter(output_path)
+    start = time.time()
+
+    for data in chunks:
+        nread += len(data)
+        #Cambiar el nombre de las columnas
+        data.columns = ['user_id', 'book_id', 'rate', 'review', 'date_added']
+
+        # Eliminar reseñas duplicadas
+        data = drop_seen_reviews(data, seen)
+
+        data = preprocess_chunk(data, batch_size=batch_size, n_process=n_process, cache=cache)
 
-data['tokens'] = data['cleaned_text'].apply(tokenize)
+        #Anadir columna id
+        data.insert(0, 'id', range(next_id, next_id + len(data)))
+        next_id += len(data)
 
-data['lemmas'] = data['tokens'].apply(lemmatize)
+        #Filtrar por las columnas requeridas y añadir a la salida
+        data = data[['id', 'user_id', 'book_id', 'rate', 'date_added', 'text']]
+        writer.write(data)
 
-# Unir de nuevo
-data['text'] = data['lemmas'].apply(lambda x: ' '.join(x))
+        elapsed = time.time() - start
+        print(f"{nread} reseñas leídas, {next_id - 1} guardadas ({nread / max(elapsed, 1e-9):.0f} reseñas/s)")
 
-#Eliminar text en blanco
-data= data[data['text'].str.strip() != '']
+    writer.close()
+    return next_id - 1
 
-#Anadir columna id
-data.insert(0, 'id', range(1, len(data)+1))
 
-#Filtrar por las columnas requeridas
-data = data[['id', 'user_id', 'book_id', 'rate', 'date_added', 'text']]
+if __name__ == "__main__":
+    # Entrada y salida en CSV o Parquet (.parquet)
+    file_path = " "
+    output_path = " "
 
-print(data)
+    # Parámetros del preprocesado (cambiar a los deseados)
+    chunksize = 100000  # Filas por bloque (None para leer el archivo completo)
+    batch_size = 1000   # Reseñas por lote de spaCy
+    n_process = 1       # Procesos de spaCy
+    use_cache = False   # Caché de lemas por token (más rápido, lemas independientes del contexto)
 
-#Guardamos la base
-data.to_csv(" ", index = False)
+    total = preprocess_file(file_path, output_path, chunksize=chunksize, batch_size=batch_size,
+                            n_process=n_process, use_cache=use_cache)
+    print(f"Base guardada con {total} reseñas")
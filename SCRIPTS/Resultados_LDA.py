@@ -0,0 +1,765 @@
+"""
+Almacenamiento de los resultados de los modelos LDA.
+
+Los resultados (ust, stw, ta) se guardan como arrays binarios comprimidos
+junto con sus metadatos (hiperparámetros, semilla, último lote, hash del
+vocabulario). El formato se elige por la extensión del archivo:
+
+- `.npz`: arrays de NumPy comprimidos (formato por defecto).
+- `.h5` / `.hdf5`: HDF5, requiere h5py.
+- `.json`: exportación heredada con listas de Python.
+
+Las muestras a posteriori se acumulan durante el muestreo con una política de
+almacenamiento (`make_store`): todas en memoria, solo media y varianza
+(Welford), una reserva de tamaño fijo o todas en un memmap en disco.
+
+Los scripts de análisis leen los resultados con `ResultsReader`, que calcula
+la media, la moda de ta o las últimas muestras recorriendo cada array por
+bloques, sin cargarlo entero en memoria.
+
+Los puntos de control por lotes se guardan en una carpeta: cada lote escribe
+solo las muestras que ha generado y el estado del muestreador, y un manifiesto
+(`manifest.json`) lista los lotes completados. Todos los archivos se escriben
+de forma atómica (archivo temporal, fsync y renombrado), por lo que una
+interrupción nunca deja un punto de control a medias.
+"""
+
+import hashlib
+import json
+import os
+import zipfile
+import numpy as np
+
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+RESULT_KEYS = ("ust", "stw", "ta")
+
+
+def vocabulary_hash(words):
+    '''
+    Calcula un hash del vocabulario para comprobar que los resultados y la
+    lista de palabras corresponden al mismo corpus.
+
+    Parameters
+    ----------
+    words : Lista de palabras del vocabulario, en el orden de las columnas.
+    '''
+    return hashlib.sha256("\n".join(map(str, words)).encode("utf-8")).hexdigest()
+
+
+def check_vocabulary(metadata, words):
+    '''
+    Avisa si el vocabulario no coincide con el usado al guardar los resultados.
+
+    Parameters
+    ----------
+    metadata : Metadatos devueltos por load_results.
+    words : Lista de palabras del vocabulario.
+    '''
+    expected = metadata.get("vocabulary_hash")
+    if expected is not None and expected != vocabulary_hash(words):
+        print("Aviso: el vocabulario no coincide con el usado en el modelo.")
+
+
+def _format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npz":
+        return "npz"
+    if ext in (".h5", ".hdf5"):
+        return "hdf5"
+    if ext == ".json":
+        return "json"
+    raise ValueError(f"Formato de resultados no reconocido: {path}")
+
+
+def _atomic_replace(tmp_path, path):
+    '''Sincroniza el archivo temporal con el disco y lo renombra de forma atómica.'''
+    fd = os.open(tmp_path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+    # Sincronizar también la carpeta para que el renombrado sea persistente
+    if hasattr(os, "O_DIRECTORY"):
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def _to_builtin(value):
+    '''Convierte escalares de NumPy a tipos de Python para serializarlos en JSON.'''
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def save_results(path, results, metadata=None):
+    '''
+    Guarda los resultados y sus metadatos. El formato depende de la extensión.
+
+    Parameters
+    ----------
+    path : Ruta del archivo (.npz, .h5/.hdf5 o .json).
+    results : Diccionario con los arrays a guardar (ust, stw, ta...).
+    metadata : Diccionario con los metadatos (hiperparámetros, semilla...).
+    '''
+    metadata = {key: _to_builtin(value) for key, value in (metadata or {}).items()}
+    fmt = _format(path)
+    root, ext = os.path.splitext(path)
+    tmp_path = f"{root}.tmp{ext}"
+
+    if fmt == "npz":
+        np.savez_compressed(tmp_path, metadata=np.array(json.dumps(metadata)),
+                            **{key: np.asarray(value) for key, value in results.items()})
+    elif fmt == "hdf5":
+        if h5py is None:
+            raise ImportError("Se requiere h5py para guardar resultados en HDF5.")
+        with h5py.File(tmp_path, "w") as f:
+            for key, value in results.items():
+                f.create_dataset(key, data=np.asarray(value), compression="gzip")
+            f.attrs["metadata"] = json.dumps(metadata)
+    else:
+        data = {key: np.asarray(value).tolist() for key, value in results.items()}
+        data.update(metadata)
+        with open(tmp_path, "w") as f:
+            json.dump(data, f)
+
+    _atomic_replace(tmp_path, path)
+
+
+def load_results(path):
+    '''
+    Carga los resultados guardados con save_results (o un JSON heredado).
+    Devuelve un diccionario de arrays de NumPy y otro con los metadatos.
+
+    Parameters
+    ----------
+    path : Ruta del archivo (.npz, .h5/.hdf5 o .json).
+    '''
+    fmt = _format(path)
+
+    if fmt == "npz":
+        with np.load(path) as data:
+            results = {key: data[key] for key in data.files if key != "metadata"}
+            metadata = json.loads(str(data["metadata"])) if "metadata" in data.files else {}
+    elif fmt == "hdf5":
+        if h5py is None:
+            raise ImportError("Se requiere h5py para leer resultados en HDF5.")
+        with h5py.File(path, "r") as f:
+            results = {key: f[key][()] for key in f.keys()}
+            metadata = json.loads(f.attrs.get("metadata", "{}"))
+    else:
+        with open(path, "r") as f:
+            data = json.load(f)
+        results = {key: np.array(value) for key, value in data.items()
+                   if key in RESULT_KEYS or isinstance(value, list)}
+        metadata = {key: value for key, value in data.items() if key not in results}
+
+    return results, metadata
+
+
+def load_metadata(path):
+    '''
+    Lee solo los metadatos de un archivo de resultados, sin cargar los arrays
+    (salvo en el formato JSON heredado).
+
+    Parameters
+    ----------
+    path : Ruta del archivo (.npz, .h5/.hdf5 o .json).
+    '''
+    fmt = _format(path)
+
+    if fmt == "npz":
+        with np.load(path) as data:
+            return json.loads(str(data["metadata"])) if "metadata" in data.files else {}
+    if fmt == "hdf5":
+        if h5py is None:
+            raise ImportError("Se requiere h5py para leer resultados en HDF5.")
+        with h5py.File(path, "r") as f:
+            return json.loads(f.attrs.get("metadata", "{}"))
+    return load_results(path)[1]
+
+
+def _block_index(shape, max_elements, whole_axes=0):
+    '''
+    Índices (tuplas de enteros y un slice) que recorren un array en orden C
+    por bloques de elementos consecutivos, cada uno con todas las iteraciones
+    (último eje) y como mucho max_elements elementos (o una sola fila si una
+    fila ya los supera). Los whole_axes ejes anteriores al de iteraciones se
+    mantienen siempre completos en cada bloque.
+
+    Parameters
+    ----------
+    shape : Forma del array.
+    max_elements : Número máximo de elementos por bloque.
+    whole_axes : Número de ejes, antes del de iteraciones, que no se parten.
+    '''
+    leading = shape[:-1]
+    row = shape[-1] if shape else 1
+    if not leading:
+        yield ()
+        return
+    max_rows = max(1, max_elements // max(1, row))
+    # Menor profundidad d cuyos subbloques shape[d:-1] caben en un bloque
+    max_depth = len(leading) - whole_axes
+    d = max_depth
+    for depth in range(1, max_depth + 1):
+        if int(np.prod(leading[depth:])) <= max_rows:
+            d = depth
+            break
+    if d == 0:
+        yield ()
+        return
+    step = max(1, max_rows // int(np.prod(leading[d:])))
+    for prefix in np.ndindex(*leading[:d - 1]):
+        for start in range(0, leading[d - 1], step):
+            yield tuple(int(i) for i in prefix) + (slice(start, min(start + step, leading[d - 1])),)
+
+
+def _block_shape(shape, index):
+    '''Forma del bloque shape[index].'''
+    block = []
+    for axis, idx in enumerate(index):
+        if isinstance(idx, slice):
+            block.append(len(range(*idx.indices(shape[axis]))))
+    return tuple(block) + tuple(shape[len(index):])
+
+
+class ResultsReader:
+    def __init__(self, path, max_elements=2**24):
+        '''
+        Lectura perezosa de un archivo de resultados para calcular reducciones
+        sobre el eje de iteraciones (media, moda de ta, últimas muestras) sin
+        cargar los arrays completos. Los arrays se recorren por bloques de
+        elementos con todas sus iteraciones, de como mucho max_elements
+        valores: con NPZ se descomprime cada array de forma secuencial y con
+        HDF5 se lee cada bloque del archivo. El formato JSON heredado se carga
+        entero.
+
+        Parameters
+        ----------
+        path : Ruta del archivo (.npz, .h5/.hdf5 o .json).
+        max_elements : Número máximo de valores en memoria por bloque.
+        '''
+        self.path = path
+        self.max_elements = max_elements
+        self.fmt = _format(path)
+        self.arrays = None
+        self.file = None
+
+        if self.fmt == "npz":
+            self.file = zipfile.ZipFile(path)
+            names = [name[:-4] for name in self.file.namelist() if name.endswith(".npy")]
+            self.keys = [key for key in names if key != "metadata"]
+            self.metadata = load_metadata(path) if "metadata" in names else {}
+            self.shapes = {}
+            for key in self.keys:
+                with self.file.open(f"{key}.npy") as f:
+                    self.shapes[key] = self._read_header(f)[0]
+        elif self.fmt == "hdf5":
+            if h5py is None:
+                raise ImportError("Se requiere h5py para leer resultados en HDF5.")
+            self.file = h5py.File(path, "r")
+            self.keys = list(self.file.keys())
+            self.metadata = json.loads(self.file.attrs.get("metadata", "{}"))
+            self.shapes = {key: self.file[key].shape for key in self.keys}
+        else:
+            self.arrays, self.metadata = load_results(path)
+            self.keys = list(self.arrays)
+            self.shapes = {key: value.shape for key, value in self.arrays.items()}
+
+    @staticmethod
+    def _read_header(f):
+        version = np.lib.format.read_magic(f)
+        if version == (1, 0):
+            return np.lib.format.read_array_header_1_0(f)
+        return np.lib.format.read_array_header_2_0(f)
+
+    def shape(self, key):
+        '''
+        Forma de un resultado, sin leerlo.
+
+        Parameters
+        ----------
+        key : Nombre del resultado (ust, stw, ta...).
+        '''
+        return self.shapes[key]
+
+    def iter_blocks(self, key, whole_axes=0):
+        '''
+        Recorre un resultado por bloques. Devuelve pares (índice, bloque), donde
+        bloque es array[índice] con todas las iteraciones en el último eje.
+
+        Parameters
+        ----------
+        key : Nombre del resultado (ust, stw, ta...).
+        whole_axes : Número de ejes, antes del de iteraciones, que no se parten
+            (p.ej. 1 para tener en cada bloque distribuciones completas sobre las palabras).
+        '''
+        if key not in self.shapes:
+            raise KeyError(f"El archivo {self.path} no contiene el resultado {key}")
+        shape = self.shapes[key]
+
+        if self.fmt == "npz":
+            with self.file.open(f"{key}.npy") as f:
+                _, fortran_order, dtype = self._read_header(f)
+                if fortran_order:
+                    # Con orden de Fortran los bloques no son consecutivos: se lee entero
+                    f.seek(0)
+                    array = np.lib.format.read_array(f)
+                    for index in _block_index(shape, self.max_elements, whole_axes):
+                        yield index, array[index]
+                    return
+                # En orden C los bloques son consecutivos en el archivo
+                for index in _block_index(shape, self.max_elements, whole_axes):
+                    block_shape = _block_shape(shape, index)
+                    count = int(np.prod(block_shape))
+                    data = f.read(count * dtype.itemsize)
+                    yield index, np.frombuffer(data, dtype=dtype, count=count).reshape(block_shape)
+            return
+
+        array = self.file[key] if self.fmt == "hdf5" else self.arrays[key]
+        for index in _block_index(shape, self.max_elements, whole_axes):
+            yield index, np.asarray(array[index])
+
+    def mean(self, key, transform=None):
+        '''
+        Media sobre el eje de iteraciones, equivalente a array.mean(axis=-1).
+
+        Parameters
+        ----------
+        key : Nombre del resultado (ust, stw...).
+        transform : Función que se aplica a cada bloque antes de la media
+            (p.ej. normalizar cada muestra sobre las palabras). Recibe bloques
+            con el penúltimo eje completo y devuelve un array de la misma forma.
+        '''
+        shape = self.shapes[key]
+        mean = np.zeros(shape[:-1])
+        for index, block in self.iter_blocks(key, whole_axes=1 if transform is not None else 0):
+            if transform is not None:
+                block = transform(block)
+            mean[index] = block.mean(axis=-1)
+        return mean
+
+    def mode(self, key="ta", nT=None):
+        '''
+        Valor más repetido sobre el eje de iteraciones (a igualdad, el menor,
+        como scipy.stats.mode), para resultados enteros como ta.
+
+        Parameters
+        ----------
+        key : Nombre del resultado (por defecto, ta).
+        nT : Número de valores posibles (por defecto, el de los metadatos).
+        '''
+        nT = nT or self.metadata.get("nT")
+        shape = self.shapes[key]
+        mode = np.zeros(shape[:-1], dtype=np.int64)
+        for index, block in self.iter_blocks(key):
+            rows = block.reshape(-1, shape[-1]).astype(np.int64)
+            n = nT or int(rows.max()) + 1
+            counts = np.bincount((np.arange(len(rows))[:, None] * n + rows).ravel(), minlength=len(rows) * n)
+            mode[index] = np.argmax(counts.reshape(len(rows), n), axis=1).reshape(block.shape[:-1])
+        return mode
+
+    def last(self, key, k):
+        '''
+        Últimas k muestras del eje de iteraciones, equivalente a array[..., -k:].
+
+        Parameters
+        ----------
+        key : Nombre del resultado (ust, stw, ta...).
+        k : Número de muestras.
+        '''
+        shape = self.shapes[key]
+        k = min(k, shape[-1])
+        last = None
+        for index, block in self.iter_blocks(key):
+            if last is None:
+                last = np.zeros(shape[:-1] + (k,), dtype=block.dtype)
+            last[index] = block[..., shape[-1] - k:]
+        return last if last is not None else np.zeros(shape[:-1] + (k,))
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ResultsWriter:
+    def __init__(self, path, nsaved):
+        '''
+        Escribe un archivo de resultados por partes a lo largo del eje de
+        iteraciones, sin tener todas las muestras en memoria. Con NPZ las
+        partes se escriben en archivos .npy proyectados en memoria que se
+        comprimen al cerrar; con HDF5 se escriben directamente en el archivo.
+        El formato JSON heredado se acumula en memoria.
+
+        Parameters
+        ----------
+        path : Ruta del archivo de salida (.npz, .h5/.hdf5 o .json).
+        nsaved : Número total de muestras.
+        '''
+        self.path = path
+        self.nsaved = nsaved
+        self.fmt = _format(path)
+        self.arrays = {}
+        root, ext = os.path.splitext(path)
+
+        if self.fmt == "npz":
+            self.parts_dir = f"{root}.partes"
+            os.makedirs(self.parts_dir, exist_ok=True)
+        elif self.fmt == "hdf5":
+            if h5py is None:
+                raise ImportError("Se requiere h5py para guardar resultados en HDF5.")
+            self.tmp_path = f"{root}.tmp{ext}"
+            self.file = h5py.File(self.tmp_path, "w")
+
+    def _array(self, key, shape, dtype):
+        if key not in self.arrays:
+            full_shape = tuple(shape[:-1]) + (self.nsaved,)
+            if self.fmt == "npz":
+                self.arrays[key] = np.lib.format.open_memmap(os.path.join(self.parts_dir, f"{key}.npy"),
+                                                             mode="w+", dtype=dtype, shape=full_shape)
+            elif self.fmt == "hdf5":
+                self.arrays[key] = self.file.create_dataset(key, shape=full_shape, dtype=dtype,
+                                                            compression="gzip")
+            else:
+                self.arrays[key] = np.zeros(full_shape, dtype=dtype)
+        return self.arrays[key]
+
+    def write(self, samples, first, last):
+        '''
+        Escribe las muestras de un rango de índices [first, last).
+
+        Parameters
+        ----------
+        samples : Diccionario de arrays con las muestras en el último eje.
+        first : Índice de la primera muestra.
+        last : Índice siguiente a la última muestra.
+        '''
+        for key, value in samples.items():
+            self._array(key, value.shape, value.dtype)[..., first:last] = value
+
+    def close(self, metadata=None):
+        '''
+        Termina el archivo de salida y guarda los metadatos.
+
+        Parameters
+        ----------
+        metadata : Diccionario con los metadatos.
+        '''
+        metadata = {key: _to_builtin(value) for key, value in (metadata or {}).items()}
+        if self.fmt == "hdf5":
+            self.file.attrs["metadata"] = json.dumps(metadata)
+            self.file.close()
+            _atomic_replace(self.tmp_path, self.path)
+            return
+
+        # np.savez escribe los memmap por bloques, sin cargarlos enteros en memoria
+        save_results(self.path, self.arrays, metadata)
+        if self.fmt == "npz":
+            names = [os.path.join(self.parts_dir, f"{key}.npy") for key in self.arrays]
+            self.arrays = {}
+            for name in names:
+                os.remove(name)
+            os.rmdir(self.parts_dir)
+
+
+STORAGE_POLICIES = ("all", "mean", "reservoir", "memmap")
+
+
+class AllSamples:
+    def __init__(self, shapes, nsaved):
+        '''
+        Guarda todas las muestras en memoria, con la iteración en el último eje.
+
+        Parameters
+        ----------
+        shapes : Diccionario con la forma de cada resultado (sin el eje de iteraciones).
+        nsaved : Número de muestras a guardar.
+        '''
+        self.samples = {key: np.zeros(shape + (nsaved,)) for key, shape in shapes.items()}
+
+    def add(self, idx, sample):
+        for key, value in sample.items():
+            self.samples[key][..., idx] = value
+
+    def results(self):
+        return self.samples
+
+    def lot_samples(self, first, last):
+        # Solo las muestras generadas en el lote
+        return {key: value[..., first:last] for key, value in self.samples.items()}
+
+    def restore(self, results, entry):
+        # Recolocar las muestras de un lote guardado en su rango
+        for key in self.samples:
+            self.samples[key][..., entry["first_sample"]:entry["last_sample"]] = results[key]
+
+
+class RunningMean:
+    def __init__(self, shapes, nT):
+        '''
+        Guarda solo la media y la varianza de las muestras (algoritmo de
+        Welford). Para ta se acumula el número de veces que cada documento se
+        asigna a cada tópico, y se devuelve la moda.
+
+        Parameters
+        ----------
+        shapes : Diccionario con la forma de cada resultado (sin el eje de iteraciones).
+        nT : Número de tópicos.
+        '''
+        self.n = 0
+        self.mean = {key: np.zeros(shape) for key, shape in shapes.items() if key != "ta"}
+        self.m2 = {key: np.zeros(shape) for key, shape in shapes.items() if key != "ta"}
+        self.ta_counts = np.zeros(shapes["ta"] + (nT,), dtype=np.int64) if "ta" in shapes else None
+
+    def add(self, idx, sample):
+        self.n += 1
+        for key, value in sample.items():
+            if key == "ta":
+                self.ta_counts[np.arange(len(value)), np.asarray(value, dtype=np.int64)] += 1
+                continue
+            delta = value - self.mean[key]
+            self.mean[key] += delta / self.n
+            self.m2[key] += delta * (value - self.mean[key])
+
+    def results(self):
+        # Se mantiene el eje de iteraciones (de tamaño 1) para que .mean(axis=-1) siga funcionando
+        results = {key: value[..., np.newaxis] for key, value in self.mean.items()}
+        for key, value in self.m2.items():
+            results[f"{key}_var"] = value / max(self.n - 1, 1)
+        if self.ta_counts is not None:
+            results["ta"] = np.argmax(self.ta_counts, axis=-1)[:, np.newaxis].astype(np.float64)
+            results["ta_counts"] = self.ta_counts
+        return results
+
+    def lot_samples(self, first, last):
+        # El estado acumulado tiene tamaño fijo, se guarda completo junto con
+        # el estado interno necesario para reanudar
+        state = {"state_store_n": np.array(self.n)}
+        for key in self.mean:
+            state[f"state_store_mean_{key}"] = self.mean[key]
+            state[f"state_store_m2_{key}"] = self.m2[key]
+        if self.ta_counts is not None:
+            state["state_store_ta_counts"] = self.ta_counts
+        return {**self.results(), **state}
+
+    def restore(self, results, entry):
+        self.n = int(results["state_store_n"])
+        for key in self.mean:
+            self.mean[key][...] = results[f"state_store_mean_{key}"]
+            self.m2[key][...] = results[f"state_store_m2_{key}"]
+        if self.ta_counts is not None:
+            self.ta_counts[...] = results["state_store_ta_counts"]
+
+
+class Reservoir:
+    def __init__(self, shapes, size, seed=None):
+        '''
+        Guarda una muestra uniforme de tamaño fijo de las iteraciones
+        (muestreo de reserva). Usa su propio generador aleatorio para no
+        alterar la secuencia del muestreo de Gibbs.
+
+        Parameters
+        ----------
+        shapes : Diccionario con la forma de cada resultado (sin el eje de iteraciones).
+        size : Número máximo de muestras guardadas.
+        seed : Semilla del generador de la reserva.
+        '''
+        self.size = size
+        self.n = 0
+        self.rng = np.random.RandomState(seed)
+        self.samples = {key: np.zeros(shape + (size,)) for key, shape in shapes.items()}
+        self.iterations = np.full(size, -1, dtype=np.int64)
+
+    def add(self, idx, sample):
+        slot = self.n if self.n < self.size else self.rng.randint(0, self.n + 1)
+        self.n += 1
+        if slot >= self.size:
+            return
+        for key, value in sample.items():
+            self.samples[key][..., slot] = value
+        self.iterations[slot] = idx
+
+    def results(self):
+        # Muestras ordenadas por iteración
+        filled = min(self.n, self.size)
+        order = np.argsort(self.iterations[:filled])
+        results = {key: value[..., order] for key, value in self.samples.items()}
+        results["iterations"] = self.iterations[:filled][order]
+        return results
+
+    def lot_samples(self, first, last):
+        # El estado acumulado tiene tamaño fijo, se guarda completo junto con
+        # el estado interno necesario para reanudar
+        state = {"state_store_n": np.array(self.n), "state_store_iterations": self.iterations,
+                 **pack_rng_state(self.rng.get_state(), prefix="state_store_rng")}
+        for key, value in self.samples.items():
+            state[f"state_store_samples_{key}"] = value
+        return {**self.results(), **state}
+
+    def restore(self, results, entry):
+        self.n = int(results["state_store_n"])
+        self.iterations[...] = results["state_store_iterations"]
+        self.rng.set_state(unpack_rng_state(results, prefix="state_store_rng"))
+        for key in self.samples:
+            self.samples[key][...] = results[f"state_store_samples_{key}"]
+
+
+class MemmapSamples:
+    def __init__(self, shapes, nsaved, directory):
+        '''
+        Guarda todas las muestras en archivos .npy proyectados en memoria
+        (memmap), de forma que la memoria usada no depende de nsaved.
+
+        Parameters
+        ----------
+        shapes : Diccionario con la forma de cada resultado (sin el eje de iteraciones).
+        nsaved : Número de muestras a guardar.
+        directory : Carpeta donde se crean los archivos.
+        '''
+        os.makedirs(directory, exist_ok=True)
+        self.samples = {key: np.lib.format.open_memmap(os.path.join(directory, f"{key}.npy"), mode="w+",
+                                                       dtype=np.float64, shape=shape + (nsaved,))
+                        for key, shape in shapes.items()}
+
+    def add(self, idx, sample):
+        for key, value in sample.items():
+            self.samples[key][..., idx] = value
+
+    def results(self):
+        for value in self.samples.values():
+            value.flush()
+        return self.samples
+
+    def lot_samples(self, first, last):
+        # Solo las muestras generadas en el lote
+        return {key: np.asarray(value[..., first:last]) for key, value in self.samples.items()}
+
+    def restore(self, results, entry):
+        # Recolocar las muestras de un lote guardado en su rango
+        for key in self.samples:
+            self.samples[key][..., entry["first_sample"]:entry["last_sample"]] = results[key]
+
+
+def make_store(policy, shapes, nsaved, nT=None, size=None, directory=None, seed=None):
+    '''
+    Crea el almacén de muestras según la política indicada.
+
+    Parameters
+    ----------
+    policy : "all" (todas en memoria), "mean" (media y varianza), "reservoir"
+        (reserva de tamaño fijo) o "memmap" (todas en disco).
+    shapes : Diccionario con la forma de cada resultado (sin el eje de iteraciones).
+    nsaved : Número total de muestras.
+    nT : Número de tópicos (política "mean").
+    size : Tamaño de la reserva (política "reservoir").
+    directory : Carpeta de los archivos (política "memmap").
+    seed : Semilla de la reserva (política "reservoir").
+    '''
+    if policy == "all":
+        return AllSamples(shapes, nsaved)
+    if policy == "mean":
+        return RunningMean(shapes, nT)
+    if policy == "reservoir":
+        return Reservoir(shapes, min(size or nsaved, nsaved), seed)
+    if policy == "memmap":
+        return MemmapSamples(shapes, nsaved, directory or "muestras_LDA")
+    raise ValueError(f"Política de almacenamiento desconocida: {policy}. Opciones: {STORAGE_POLICIES}")
+
+
+def normalize_counts(counts):
+    '''
+    Normaliza los conteos sobre el último eje para obtener distribuciones.
+
+    Parameters
+    ----------
+    counts : Matriz de conteos (ust o stw).
+    '''
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return counts / np.sum(counts, axis=-1, keepdims=True)
+
+
+MANIFEST = "manifest.json"
+
+# Políticas cuyo archivo de lote contiene el estado acumulado y no solo las muestras del lote
+CUMULATIVE_POLICIES = ("mean", "reservoir")
+
+
+def read_manifest(directory):
+    '''
+    Lee el manifiesto de lotes completados de una carpeta de puntos de control.
+
+    Parameters
+    ----------
+    directory : Carpeta de puntos de control.
+    '''
+    with open(os.path.join(directory, MANIFEST), "r") as f:
+        return json.load(f)
+
+
+def write_manifest(directory, manifest):
+    '''
+    Escribe el manifiesto de lotes completados.
+
+    Parameters
+    ----------
+    directory : Carpeta de puntos de control.
+    manifest : Diccionario con los metadatos del modelo y la lista de lotes.
+    '''
+    path = os.path.join(directory, MANIFEST)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    _atomic_replace(f"{path}.tmp", path)
+
+
+def pack_rng_state(state, prefix="state_rng"):
+    '''
+    Convierte el estado de un generador MT19937 (get_state()) en arrays.
+
+    Parameters
+    ----------
+    state : Estado devuelto por np.random.get_state() o RandomState.get_state().
+    prefix : Prefijo de los nombres de los arrays.
+    '''
+    _, keys, pos, has_gauss, cached_gaussian = state
+    return {f"{prefix}_keys": np.asarray(keys, dtype=np.uint32),
+            f"{prefix}_extra": np.array([pos, has_gauss, cached_gaussian], dtype=np.float64)}
+
+
+def unpack_rng_state(results, prefix="state_rng"):
+    '''
+    Reconstruye el estado para set_state() a partir de los arrays de un lote.
+
+    Parameters
+    ----------
+    results : Arrays del archivo de lote.
+    prefix : Prefijo de los nombres de los arrays.
+    '''
+    pos, has_gauss, cached_gaussian = results[f"{prefix}_extra"]
+    return ("MT19937", np.asarray(results[f"{prefix}_keys"], dtype=np.uint32), int(pos),
+            int(has_gauss), float(cached_gaussian))
+
+
+def load_lot_samples(path):
+    '''
+    Carga las muestras de un archivo de lote, sin el estado del muestreador.
+
+    Parameters
+    ----------
+    path : Ruta del archivo de lote.
+    '''
+    results, metadata = load_results(path)
+    return {key: value for key, value in results.items() if not key.startswith("state_")}, metadata
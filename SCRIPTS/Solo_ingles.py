@@ -1,51 +1,188 @@
 # -*- coding: utf-8 -*-
 """
 Este scrpt filtra reseñas en inglés con rating no nulo y guarda los resultados en un nuevo archivo JSON.
+
+Las líneas se leen por lotes que se reparten entre varios procesos; la salida
+conserva el orden del archivo original. langdetect se inicializa con una
+semilla fija, de modo que el resultado es reproducible y no depende del
+número de procesos.
 """
 
 import json
-from langdetect import detect
+import time
+from collections import Counter, deque
+from itertools import islice
+from multiprocessing import Pool
+from langdetect import detect, DetectorFactory
 
 #Longitud mínima de una reseña
-min_text_length = 2 
+min_text_length = 2
+
+#Proporción mínima de caracteres ASCII para llamar al detector (p.ej. 0.5). Con None
+#no se usa el filtro y la salida es la misma que la del detector solo; si se activa,
+#se pueden descartar reseñas que langdetect habría aceptado como inglés
+min_ascii_ratio = None
+
+#Semilla de langdetect
+detector_seed = 0
+
+# Eliminar información irrelevantes para el análisis
+dropped_fields = ['review_id', 'date_updated', 'read_at', 'started_at', 'n_votes', 'n_comments']
+
+
+def init_detector(seed=detector_seed):
+    """
+    Fija la semilla de langdetect en el proceso actual.
+    """
+    DetectorFactory.seed = seed
+
+
+def language_check(quote):
+    """
+    Verifica si una reseña está escrita en inglés y devuelve el motivo.
+    Antes de llamar a langdetect descarta las reseñas demasiado cortas y, si
+    min_ascii_ratio no es None, las que tienen pocos caracteres ASCII.
+
+    Parameters
+    ----------
+    quote : str
+        Reseña de texto.
+    """
+    if len(quote.split()) < min_text_length:
+        return 'short'
+    if min_ascii_ratio is not None:
+        text = quote.replace(' ', '')
+        if text and sum(c.isascii() for c in text) < min_ascii_ratio * len(text):
+            return 'non_ascii'
+    try:
+        lang = detect(quote)
+    except Exception:
+        return 'unknown'
+    return 'english' if lang == 'en' else 'other_language'
+
 
 def is_in_english(quote):
-  """
+    """
     Verifica si una reseña está escrita en inglés.
     Utiliza la librería langdetect para detectar el idioma.
     """
-  lang= 'it'
-  try:
-      lang = detect(quote)
-  except:
-      print('Lengua no reconocida')
-  return False if ((lang!= 'en') or len(quote.split()) < min_text_length) else True
-
-#Obtener la base originar y crear base final
-with open('.json', 'r') as sourcefile, open('.json', 'w') as destfile:
-    intIndex=0
-    for s in sourcefile:
+    return language_check(quote) == 'english'
+
+
+def filter_batch(lines):
+    """
+    Filtra un lote de líneas y devuelve las líneas de salida, en el mismo
+    orden, junto con los conteos de cada motivo de descarte.
+
+    Parameters
+    ----------
+    lines : list
+        Líneas JSON del archivo original.
+    """
+    output = []
+    counts = Counter()
+    for s in lines:
         data = json.loads(s)
+        for field in dropped_fields:
+            data.pop(field)
+
+        #Verificar que el rating no sea 0
+        if data['rating'] == 0:
+            counts['rating_0'] += 1
+            continue
+
+        # Verificar si la reseña está en inglés
+        reason = language_check(data['review_text'])
+        counts[reason] += 1
+        if reason == 'english':
+            output.append(json.dumps(data) + '\n')
+    return output, counts
+
+
+def batches(lines, batch_size):
+    """
+    Agrupa las líneas del archivo en lotes de batch_size líneas.
+    """
+    while True:
+        batch = list(islice(lines, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def ordered_results(batch_iter, nprocesses, max_pending):
+    """
+    Reparte los lotes entre nprocesses procesos y devuelve sus resultados en
+    el orden de los lotes. Como mucho hay max_pending lotes en curso, de modo
+    que la memoria no depende del tamaño del archivo.
+    """
+    if nprocesses <= 1:
+        init_detector()
+        yield from map(filter_batch, batch_iter)
+        return
+
+    with Pool(nprocesses, initializer=init_detector) as pool:
+        pending = deque()
+        for batch in batch_iter:
+            pending.append(pool.apply_async(filter_batch, (batch,)))
+            if len(pending) >= max_pending:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+
+
+def filter_file(source_path, dest_path, nprocesses=4, batch_size=2000, report_every=500000):
+    """
+    Filtra el archivo de reseñas con varios procesos y escribe las reseñas en
+    inglés con rating no nulo en el archivo de salida. Devuelve los conteos
+    de reseñas guardadas y descartadas por cada motivo.
+
+    Parameters
+    ----------
+    source_path : str
+        Archivo JSON de entrada (una reseña por línea).
+    dest_path : str
+        Archivo JSON de salida.
+    nprocesses : int
+        Número de procesos.
+    batch_size : int
+        Número de líneas por lote.
+    report_every : int
+        Número de líneas entre mensajes de progreso.
+    """
+    counts = Counter()
+    nread = 0
+    next_report = report_every
+    start = time.time()
+
+    with open(source_path, 'r') as sourcefile, open(dest_path, 'w') as destfile:
+        for output, batch_counts in ordered_results(batches(sourcefile, batch_size), nprocesses,
+                                                    max_pending=4 * nprocesses):
+            destfile.writelines(output)
+            counts.update(batch_counts)
+            nread = sum(counts.values())
+
+            if nread >= next_report:
+                elapsed = time.time() - start
+                print(f"{nread} líneas, {counts['english']} guardadas ({nread / elapsed:.0f} líneas/s)")
+                next_report += report_every
+
+    return counts
+
+
+if __name__ == "__main__":
+    #Parámetros del filtrado (cambiar a los deseados)
+    nprocesses = 4
+    batch_size = 2000
+
+    #Obtener la base originar y crear base final
+    start = time.time()
+    counts = filter_file('.json', '.json', nprocesses=nprocesses, batch_size=batch_size)
+    elapsed = time.time() - start
 
-      # Eliminar información irrelevantes para el análisis
-        data.pop('review_id')
-        data.pop('date_updated')
-        data.pop('read_at')
-        data.pop('started_at')
-        data.pop('n_votes')
-        data.pop('n_comments')
-      
-        #Verificar el idioma
-        text_to_know=data['review_text']
-      
-      # Verificar si la reseña está en inglés
-        boolean_answer = is_in_english(text_to_know)
-        if(boolean_answer):
-          
-          #Verificar que el rating no sea 0
-            if data['rating']!=0 :
-                json.dump(data, destfile)
-                destfile.write('\n')
-                intIndex+=1
-              
-    print("New database contains: ", str(intIndex), " entries")
+    nread = sum(counts.values())
+    print(f"Procesadas {nread} líneas en {elapsed:.0f} s ({nread / max(elapsed, 1e-9):.0f} líneas/s)")
+    print(f"Descartadas: rating 0: {counts['rating_0']}, demasiado cortas: {counts['short']}, "
+          f"pocos caracteres ASCII: {counts['non_ascii']}, lengua no reconocida: {counts['unknown']}, "
+          f"otra lengua: {counts['other_language']}")
+    print("New database contains: ", str(counts['english']), " entries")
@@ -0,0 +1,228 @@
+"""
+Lectura y escritura de las tablas intermedias entre las etapas del proceso
+(reseñas filtradas, reseñas por género, reseñas preprocesadas, puntuaciones y
+usuarios).
+
+El formato se elige por la extensión del archivo:
+
+- `.parquet`: Parquet (requiere pyarrow). Conserva los tipos de las columnas
+  y permite leer solo las columnas necesarias (proyección) y filtrar filas al
+  leer (los filtros se aplican con las estadísticas de cada grupo de filas,
+  sin leer los que no cumplen la condición).
+- `.csv`: CSV, como hasta ahora.
+- `.json` / `.jsonl`: JSON con un registro por línea.
+
+Los filtros son una lista de condiciones (columna, operador, valor) que se
+deben cumplir todas, con los operadores ==, !=, <, <=, >, >=, in y not in.
+Con CSV y JSON la proyección y los filtros se aplican tras leer cada bloque.
+"""
+
+import os
+import operator
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+TABLE_FORMATS = ("parquet", "csv", "json")
+
+_OPERATORS = {
+    "==": operator.eq,
+    "=": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "in": lambda column, value: column.isin(value),
+    "not in": lambda column, value: ~column.isin(value),
+}
+
+
+def table_format(path):
+    '''
+    Formato de una tabla según la extensión del archivo.
+
+    Parameters
+    ----------
+    path : Ruta del archivo.
+    '''
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".parquet", ".pq"):
+        if pa is None:
+            raise ImportError("Se requiere pyarrow para leer y guardar tablas en Parquet.")
+        return "parquet"
+    if ext in (".json", ".jsonl"):
+        return "json"
+    return "csv"
+
+
+def apply_filters(data, filters):
+    '''
+    Devuelve las filas de data que cumplen todos los filtros.
+
+    Parameters
+    ----------
+    data : DataFrame.
+    filters : Lista de condiciones (columna, operador, valor).
+    '''
+    if not filters:
+        return data
+    mask = pd.Series(True, index=data.index)
+    for column, op, value in filters:
+        if op not in _OPERATORS:
+            raise ValueError(f"Operador desconocido: {op}. Opciones: {tuple(_OPERATORS)}")
+        mask &= _OPERATORS[op](data[column], value)
+    return data[mask]
+
+
+def _needed_columns(columns, filters):
+    '''Columnas que hay que leer para proyectar y filtrar.'''
+    if columns is None:
+        return None
+    extra = [column for column, _, _ in filters or () if column not in columns]
+    return list(columns) + extra
+
+
+def table_columns(path):
+    '''
+    Nombres de las columnas de una tabla, leyendo solo la cabecera o el esquema.
+
+    Parameters
+    ----------
+    path : Ruta del archivo.
+    '''
+    fmt = table_format(path)
+    if fmt == "parquet":
+        return list(pq.read_schema(path).names)
+    if fmt == "json":
+        return next(iter_table(path, batch_size=1)).columns.tolist()
+    return pd.read_csv(path, nrows=0).columns.tolist()
+
+
+def iter_table(path, columns=None, filters=None, batch_size=100000, dtype=None):
+    '''
+    Lee una tabla por bloques de batch_size filas como DataFrames.
+
+    Parameters
+    ----------
+    path : Ruta del archivo (o carpeta de particiones Parquet).
+    columns : Columnas a leer (por defecto, todas).
+    filters : Lista de condiciones (columna, operador, valor).
+    batch_size : Número de filas por bloque.
+    dtype : Tipos de las columnas al leer CSV o JSON (se ignora con Parquet).
+    '''
+    fmt = "parquet" if os.path.isdir(path) else table_format(path)
+    if fmt == "parquet":
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+        expression = pq.filters_to_expression(filters) if filters else None
+        for batch in dataset.to_batches(columns=columns, filter=expression, batch_size=batch_size):
+            yield batch.to_pandas()
+        return
+
+    read_columns = _needed_columns(columns, filters)
+    if fmt == "json":
+        reader = pd.read_json(path, lines=True, chunksize=batch_size, dtype=dtype)
+    else:
+        reader = pd.read_csv(path, usecols=read_columns, chunksize=batch_size, dtype=dtype)
+
+    for data in reader:
+        data = apply_filters(data, filters)
+        if columns is not None:
+            data = data[list(columns)]
+        yield data
+
+
+def read_table(path, columns=None, filters=None, dtype=None):
+    '''
+    Lee una tabla completa como DataFrame.
+
+    Parameters
+    ----------
+    path : Ruta del archivo (o carpeta de particiones Parquet).
+    columns : Columnas a leer (por defecto, todas).
+    filters : Lista de condiciones (columna, operador, valor).
+    dtype : Tipos de las columnas al leer CSV o JSON (se ignora con Parquet).
+    '''
+    fmt = "parquet" if os.path.isdir(path) else table_format(path)
+    if fmt == "parquet":
+        return pd.read_parquet(path, columns=columns, filters=filters)
+
+    if fmt == "json":
+        data = pd.read_json(path, lines=True, dtype=dtype)
+    else:
+        data = pd.read_csv(path, usecols=_needed_columns(columns, filters), dtype=dtype)
+    data = apply_filters(data, filters)
+    return data if columns is None else data[list(columns)]
+
+
+class TableWriter:
+    def __init__(self, path):
+        '''
+        Escribe una tabla por bloques. Con Parquet, cada bloque es un grupo de
+        filas y el esquema se toma del primer bloque.
+
+        Parameters
+        ----------
+        path : Ruta del archivo de salida.
+        '''
+        self.path = path
+        self.format = table_format(path)
+        self.writer = None
+        self.schema = None
+        self.empty = None
+        self.first = True
+
+    def write(self, data):
+        '''
+        Añade un bloque de filas a la tabla.
+
+        Parameters
+        ----------
+        data : DataFrame.
+        '''
+        if self.format == "parquet":
+            if self.writer is None and len(data) == 0:
+                # Sin filas no se puede deducir el esquema; se espera al siguiente bloque
+                self.empty = data
+                return
+            table = pa.Table.from_pandas(data, schema=self.schema, preserve_index=False)
+            if self.writer is None:
+                self.schema = table.schema
+                self.writer = pq.ParquetWriter(self.path, self.schema)
+            self.writer.write_table(table)
+        elif self.format == "json":
+            data.to_json(self.path, orient="records", lines=True, mode="w" if self.first else "a")
+        else:
+            data.to_csv(self.path, index=False, mode="w" if self.first else "a", header=self.first)
+        self.first = False
+
+    def close(self):
+        if self.writer is None and self.empty is not None:
+            pq.write_table(pa.Table.from_pandas(self.empty, preserve_index=False), self.path)
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_table(data, path):
+    '''
+    Guarda un DataFrame completo en el formato indicado por la extensión.
+
+    Parameters
+    ----------
+    data : DataFrame.
+    path : Ruta del archivo de salida.
+    '''
+    with TableWriter(path) as writer:
+        writer.write(data)
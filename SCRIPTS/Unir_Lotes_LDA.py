@@ -1,81 +1,104 @@
 """
-Script para cargar, fusionar y guardar resultados parciales de un modelo LDA
-almacenados en archivos JSON. 
+Script para fusionar los resultados parciales de un modelo LDA por lotes en
+un único archivo. Acepta cualquier número de archivos de lote, en cualquier
+orden: cada lote indica en sus metadatos el rango de muestras que contiene y
+se escribe en la salida por partes, de forma que la memoria necesaria es la
+de un solo lote.
 
 """
 
 
-import json
-import numpy as np
+import glob
+import os
+from Resultados_LDA import (read_manifest, load_metadata, load_lot_samples, ResultsWriter,
+                            save_results, CUMULATIVE_POLICIES)
 
-def load_json(filename):
+def merge_lot_files(paths, output):
     '''
-    Carga un archivo JSON y lo convierte en un diccionario de NumPy arrays
+    Fusiona los archivos de lote y guarda el resultado en output
 
     Parameters
     ----------
-    filename : Archivo.
+    paths : Archivos de lote, en cualquier orden.
+    output : Archivo de salida (.npz, .h5/.hdf5 o .json).
     '''
 
-    try:
-        with open(filename, "r") as f:
-            data = json.load(f)
-        return {key: np.array(value) for key, value in data.items()}
-    except FileNotFoundError:
-        print(f"Archivo {filename} no encontrado.")
-        return None
-
-def merge_results(first_part, second_part):
+    # Leer solo los metadatos para conocer el rango de muestras de cada lote
+    lots = []
+    for path in paths:
+        metadata = load_metadata(path)
+        if "first_sample" not in metadata:
+            print(f"{path} no indica su rango de muestras, se ignora.")
+        elif metadata["first_sample"] is not None:
+            lots.append((path, metadata))
+
+    if not lots:
+        print("No hay lotes con muestras que fusionar.")
+        return False
+
+    lots.sort(key=lambda lot: lot[1]["first_sample"])
+    metadata = max((lot[1] for lot in lots), key=lambda md: md["last_complete_lot"])
+    metadata = {key: value for key, value in metadata.items()
+                if key not in ("iteration", "first_sample", "last_sample")}
+
+    # Con las políticas acumuladas, el último lote contiene el estado completo
+    if metadata.get("storage") in CUMULATIVE_POLICIES:
+        last_path = max(lots, key=lambda lot: lot[1]["last_complete_lot"])[0]
+        results, _ = load_lot_samples(last_path)
+        save_results(output, results, metadata)
+        return True
+
+    # Comprobar que los rangos no se solapan y cubren todas las muestras
+    nsaved = metadata["nsaved"]
+    covered = 0
+    for path, md in lots:
+        if md["first_sample"] < covered:
+            raise ValueError(f"El lote {path} se solapa con otro lote.")
+        if md["first_sample"] > covered:
+            print(f"Faltan las muestras {covered}-{md['first_sample'] - 1}.")
+        covered = md["last_sample"]
+    if covered < nsaved:
+        print(f"Faltan las muestras {covered}-{nsaved - 1}.")
+
+    writer = ResultsWriter(output, nsaved)
+    for path, md in lots:
+        samples, _ = load_lot_samples(path)
+        writer.write(samples, md["first_sample"], md["last_sample"])
+        print(f"Lote {md['last_complete_lot']} añadido (muestras {md['first_sample']}-{md['last_sample'] - 1}).")
+        del samples
+    writer.close(metadata)
+    return True
+
+def merge_lots(directory, output):
     '''
-    Fusiona los resultados 
+    Fusiona los lotes completados que lista el manifiesto de una carpeta de
+    puntos de control
 
     Parameters
     ----------
-    first_part : Archivo con los primeros lotes.
-    second_part : Archivo con los últimos lotes.
+    directory : Carpeta de puntos de control con el manifiesto.
+    output : Archivo de salida (.npz, .h5/.hdf5 o .json).
     '''
 
-    merged_results = {}
-
-    for key in first_part.keys():
-        shape_first = first_part[key].shape
-        shape_second = second_part[key].shape
-
-        if shape_first != shape_second:
-            print(f"Dimensiones incompatibles en {key}. No se pueden fusionar.")
-            continue
-        
-        # Manejo específico según la estructura de cada matriz
-        if key == "ust":
-            merged_results[key] = np.where(first_part[key] != 0, first_part[key], second_part[key])  
-        elif key == "stw":
-            merged_results[key] = np.where(first_part[key] != 0, first_part[key], second_part[key])  
-        elif key == "ta":
-            merged_results[key] = np.where(first_part[key] != 0, first_part[key], second_part[key])  
-        else:
-            print(f"Clave desconocida: {key}, ignorando...")
-
-    return merged_results
-
-def save_json(data, filename):
-    """Guarda los datos combinados en un archivo JSON"""
-    with open(filename, "w") as f:
-        json.dump({key: value.tolist() for key, value in data.items()}, f)
+    manifest = read_manifest(directory)
+    paths = [os.path.join(directory, entry["file"]) for entry in manifest["lots"]]
+    return merge_lot_files(paths, output)
 
 if __name__ == "__main__":
-    # Cargar los primeros 5 lotes (0-5)
-    first_part = load_json("LDA_lote_5.json")
-
-    # Cargar los siguientes 10 lotes (6-15)
-    second_part = load_json("LDA_lote_15.json")
+    # Carpeta de puntos de control usada en LDA_Lotes.py. Si no tiene manifiesto,
+    # se fusionan todos los archivos de lote que contenga.
+    directory = "LDA_lotes"
 
-    if first_part and second_part:
-        # Fusionar los resultados respetando la estructura de cada matriz
-        final_results = merge_results(first_part, second_part)
+    # Archivo final (con extensión .json se exporta en el formato heredado)
+    output = " .npz"
 
-        # Guardar el resultado final
-        save_json(final_results, " .json")
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        merged = merge_lots(directory, output)
+    else:
+        paths = [path for path in glob.glob(os.path.join(directory, "LDA_lote_*.*")) if ".tmp." not in path]
+        merged = merge_lot_files(paths, output)
 
-        print("Resultados fusionados y guardados en LDA_final.json")
+    if merged:
+        print("Resultados fusionados y guardados.")
     else:
-        print("No se pudieron fusionar los resultados porque falta un archivo.")
+        print("No se pudieron fusionar los resultados.")